@@ -0,0 +1,157 @@
+import numpy as np
+
+# Labels of the sides of the bounding box, for edges of cells that lie on it.
+bottom, right, top, left = -1, -2, -3, -4
+
+
+class BatchDiagram:
+  """
+  Diagrams of a batch of small point sets, as ragged arrays.
+
+    sites          batch x k x 2 site coordinates, as given
+    cellOffsets    batch * k + 1 offsets into cellVertices, cell of site i of
+                   diagram b being number b * k + i
+    cellVertices   vertex coordinates of every cell, counter clockwise
+    cellLabels     for each vertex of a cell, what the edge leaving it lies on: the
+                   id of the neighbouring site, or a side of the bounding box
+    edgeOffsets    batch + 1 offsets into edges and edgeSites
+    edges          E x 2 x 2 coordinates of both endpoints of each Voronoi edge
+    edgeSites      E x 2 ids of the sites on either side of each edge
+
+  Cells are clipped to the bounding box. Sites given as NaN are left out, and have
+  empty cells, so diagrams with fewer sites can be padded to k. Of duplicate sites,
+  the one with the lowest id owns the cell and the others have empty cells.
+  """
+
+  def __init__(self, sites, cellOffsets, cellVertices, cellLabels, edgeOffsets, edges, edgeSites,
+               width, height):
+    self.sites = sites
+    self.cellOffsets = cellOffsets
+    self.cellVertices = cellVertices
+    self.cellLabels = cellLabels
+    self.edgeOffsets = edgeOffsets
+    self.edges = edges
+    self.edgeSites = edgeSites
+    self.width = width
+    self.height = height
+
+  def __len__(self):
+    return len(self.sites)
+
+  def cell(self, b, i):
+    """Return coordinates of the vertices of cell i of diagram b, counter clockwise."""
+    k = self.sites.shape[1]
+    return self.cellVertices[self.cellOffsets[b * k + i]:self.cellOffsets[b * k + i + 1]]
+
+  def diagramEdges(self, b):
+    """Return edges and their sites of diagram b."""
+    return self.edges[self.edgeOffsets[b]:self.edgeOffsets[b + 1]], \
+        self.edgeSites[self.edgeOffsets[b]:self.edgeOffsets[b + 1]]
+
+
+def solveBatch(points, width, height):
+  """
+  Compute diagrams of a batch x k x 2 array of point sets at once, clipped to the box
+  [0, width] x [0, height].
+
+  Every cell starts as the bounding box and is clipped (Sutherland-Hodgman) by the
+  half plane of the bisector with each other site of its diagram in turn. Each step
+  clips the cells of all sites of all diagrams together, with array operations, so
+  the cost in Python is k steps whatever the size of the batch.
+  """
+  sites = np.asarray(points, dtype=float)
+  if sites.ndim != 3 or sites.shape[2] != 2:
+    raise ValueError('points must be given as batch x k x 2 array, got shape %s' % (sites.shape,))
+
+  batch, k = sites.shape[:2]
+  n = batch * k
+  capacity = k + 4
+
+  own = sites.reshape(n, 2)
+  present = ~np.isnan(own).any(axis=1)
+
+  # the lowest id of duplicate sites owns their cell, later copies are left out
+  same = (sites[:, :, None] == sites[:, None, :]).all(axis=3)
+  present &= ~np.tril(same, -1).any(axis=2).reshape(n)
+
+  # every polygon starts as the box, counter clockwise from (0, 0)
+  poly = np.zeros((n, capacity, 2))
+  poly[:, :4] = [(0, 0), (width, 0), (width, height), (0, height)]
+  labels = np.zeros((n, capacity), dtype=np.int64)
+  labels[:, :4] = [bottom, right, top, left]
+  counts = np.where(present, 4, 0)
+
+  rows = np.arange(n)
+  for d in range(1, k):
+    j = (rows % k + d) % k
+    other = own[rows - rows % k + j]
+    active = present & present[rows - rows % k + j]
+
+    # inside where x . 2(q - p) <= |q|^2 - |p|^2, so x is no closer to q than to p
+    normal = np.where(active[:, None], 2 * (other - own), 0)
+    offset = np.where(active, (other ** 2).sum(axis=1) - (own ** 2).sum(axis=1), 0)
+    width_now = counts.max(initial=0)
+    f = poly[:, :width_now, 0] * normal[:, :1] + poly[:, :width_now, 1] * normal[:, 1:] - offset[:, None]
+
+    # only cells with a vertex outside change, and most bisectors miss the cell
+    slots = np.arange(width_now)
+    valid = slots[None, :] < counts[:, None]
+    cut_rows = np.nonzero(((f > 0) & valid).any(axis=1))[0]
+    if len(cut_rows) == 0:
+      continue
+
+    f = f[cut_rows]
+    valid = valid[cut_rows]
+    cells = poly[cut_rows, :width_now]
+    cell_labels = labels[cut_rows, :width_now]
+    nxt = (slots[None, :] + 1) % np.maximum(counts[cut_rows], 1)[:, None]
+    f_next = np.take_along_axis(f, nxt, axis=1)
+    inside = (f <= 0) & valid
+    crosses = ((f <= 0) != (f_next <= 0)) & valid
+
+    # intersection with the bisector, on the edge from each vertex to the next
+    cells_next = np.take_along_axis(cells, nxt[:, :, None], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      t = np.where(crosses, f / (f - f_next), 0)
+    cut = cells + t[:, :, None] * (cells_next - cells)
+    cut_labels = np.where(inside, j[cut_rows, None], cell_labels)
+
+    # each vertex emits itself if inside, then the intersection on its edge if any
+    emitted = inside.astype(np.int64) + crosses
+    first = np.cumsum(emitted, axis=1) - emitted
+
+    r, m = np.nonzero(inside)
+    poly[cut_rows[r], first[r, m]] = cells[r, m]
+    labels[cut_rows[r], first[r, m]] = cell_labels[r, m]
+    r, m = np.nonzero(crosses)
+    at = first[r, m] + inside[r, m]
+    poly[cut_rows[r], at] = cut[r, m]
+    labels[cut_rows[r], at] = cut_labels[r, m]
+    counts[cut_rows] = emitted.sum(axis=1)
+
+  # drop vertices repeating the next one, left by bisectors through a vertex
+  slots = np.arange(capacity)
+  valid = slots[None, :] < counts[:, None]
+  nxt = (slots[None, :] + 1) % np.maximum(counts, 1)[:, None]
+  repeat = (poly == np.take_along_axis(poly, nxt[:, :, None], axis=1)).all(axis=2)
+  keep = valid & ~(repeat & (counts[:, None] > 1))
+
+  cell_offsets = np.zeros(n + 1, dtype=np.int64)
+  np.cumsum(keep.sum(axis=1), out=cell_offsets[1:])
+  cell_vertices = poly[keep]
+  cell_labels = labels[keep]
+
+  # Voronoi edges are the cell edges on a bisector, taken from the lower site only
+  owner = np.repeat(rows % k, keep.sum(axis=1))
+  cell = np.repeat(rows, keep.sum(axis=1))
+  following = np.arange(len(cell_vertices)) + 1
+  following[cell_offsets[1:][keep.sum(axis=1) > 0] - 1] = cell_offsets[:-1][keep.sum(axis=1) > 0]
+  is_edge = cell_labels > owner
+
+  edges = np.stack([cell_vertices[is_edge], cell_vertices[following[is_edge]]], axis=1)
+  edge_sites = np.stack([owner[is_edge], cell_labels[is_edge]], axis=1)
+  edge_offsets = np.zeros(batch + 1, dtype=np.int64)
+  np.cumsum(np.bincount(cell[is_edge] // k, minlength=batch), out=edge_offsets[1:])
+
+  return BatchDiagram(sites, cell_offsets, cell_vertices, cell_labels, edge_offsets, edges,
+                      edge_sites, width, height)
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+
+import numpy as np
+
+from src.diagram import diagramVersion, loadDiagram
+
+
+class DiagramCache:
+  """
+  Cache of computed Diagrams, addressed by the content of their input: a hash of the
+  site coordinates rounded to multiples of quantum, in the order given, of the width
+  and height, and of the engine. Inputs that round the same share one entry.
+
+  Entries are kept in two tiers. Up to entries diagrams are held in memory, least
+  recently used dropped first. With a directory, every diagram is also saved there
+  in the binary diagram format, and the least recently used files are deleted once
+  they take up more than maxBytes. A diagram found on disk is mapped back into memory
+  and moved to the memory tier.
+
+  Diagrams are shared by everyone asking for the same input, so must not be changed.
+  Counters record hits in either tier, misses and evictions from either tier.
+  """
+
+  def __init__(self, entries=64, directory=None, maxBytes=1 << 30, quantum=1e-9):
+    self.entries = entries
+    self.directory = directory
+    self.maxBytes = maxBytes
+    self.quantum = quantum
+    self.memory = OrderedDict()
+
+    # file sizes on disk, least recently used first
+    self.files = OrderedDict()
+    if directory is not None:
+      os.makedirs(directory, exist_ok=True)
+      found = [entry for entry in os.scandir(directory) if entry.name.endswith('.vd')]
+      for entry in sorted(found, key=lambda entry: entry.stat().st_mtime):
+        self.files[entry.name[:-3]] = entry.stat().st_size
+
+    self.hits = 0
+    self.diskHits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.diskEvictions = 0
+
+  def key(self, points, width, height, engine):
+    """
+    Return the key of the diagram of points, an n x 2 array, in a width x height box
+    computed by the named engine.
+    """
+    grid = np.rint(np.asarray(points, dtype=float) / self.quantum) + 0.0
+    name = engine.encode()
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(struct.pack('<IQdddI', diagramVersion, len(grid), width, height, self.quantum, len(name)))
+    digest.update(name)
+    digest.update(np.ascontiguousarray(grid, dtype='<f8').data)
+    return digest.hexdigest()
+
+  def get(self, key):
+    """Return the diagram cached under key, or None if there is none."""
+    diagram = self.memory.get(key)
+    if diagram is not None:
+      self.memory.move_to_end(key)
+      self.hits += 1
+      return diagram
+
+    if key in self.files:
+      path = self.path(key)
+      try:
+        diagram = loadDiagram(path)
+        os.utime(path)
+      except (OSError, ValueError):
+        # removed by someone else sharing the directory, or unreadable
+        del self.files[key]
+      else:
+        self.files.move_to_end(key)
+        self.diskHits += 1
+        self.remember(key, diagram)
+        return diagram
+
+    self.misses += 1
+    return None
+
+  def put(self, key, diagram):
+    """Cache diagram under key in both tiers."""
+    self.remember(key, diagram)
+    if self.directory is None:
+      return
+
+    # written under another name and moved in place, so readers never see half a file
+    path = self.path(key)
+    diagram.save(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    self.files[key] = os.path.getsize(path)
+    self.files.move_to_end(key)
+
+    total = sum(self.files.values())
+    while total > self.maxBytes and len(self.files) > 1:
+      old, size = self.files.popitem(last=False)
+      total -= size
+      try:
+        os.remove(self.path(old))
+      except FileNotFoundError:
+        pass
+      self.diskEvictions += 1
+
+  def remember(self, key, diagram):
+    """Add diagram to the memory tier, dropping the least recently used beyond entries."""
+    self.memory[key] = diagram
+    self.memory.move_to_end(key)
+    while len(self.memory) > self.entries:
+      self.memory.popitem(last=False)
+      self.evictions += 1
+
+  def path(self, key):
+    return os.path.join(self.directory, key + '.vd')
+
+  def stats(self):
+    return {
+      'hits': self.hits,
+      'diskHits': self.diskHits,
+      'misses': self.misses,
+      'evictions': self.evictions,
+      'diskEvictions': self.diskEvictions,
+      'entries': len(self.memory),
+      'files': len(self.files),
+      'bytes': sum(self.files.values()),
+    }
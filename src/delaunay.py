@@ -0,0 +1,563 @@
+import numpy as np
+
+from src.voronoi_elements.point import Point
+from src.voronoi_elements.predicates import orient2d, incircle, ccwErrBound, iccErrBound
+
+# Vertex id of the point at infinity, shared by all ghost triangles.
+infinite = -1
+
+
+class Triangulation:
+  """
+  Delaunay triangulation built by randomised incremental insertion (Bowyer-Watson).
+
+  Triangles are stored in flat lists: vertices of triangle t are
+  triangles[3t:3t + 3], counter clockwise, and adjacent[3t + i] is the triangle
+  across the edge opposite vertex i. Every edge of the convex hull is closed off by
+  a ghost triangle, which has the vertex at infinity as third vertex, so all
+  triangles have three neighbours and points outside the hull need no special case.
+  Triangles removed by an insertion are recycled through a free list.
+
+  Points are inserted in a biased randomised order: random rounds of doubling size,
+  each sorted along a grid so consecutive points are close. A new point is located
+  by walking from the triangle created last, which makes the expected cost of the
+  walk constant, and then the triangles whose circumcircle contains it are replaced
+  by a fan around it. All decisions go through the exact predicates.
+
+  Points added later, in any order, are located by walking from a vertex close by
+  instead. Vertices are hashed into buckets of a uniform grid sized to hold a few
+  sites each, and every vertex keeps one triangle around it.
+  """
+
+  def __init__(self, sites, seed=None, removed=()):
+    """
+    Triangulate sites, an n x 2 array, leaving out the ids in removed. Vertex ids
+    are rows of sites.
+    """
+    self.points = [Point(p) for p in sites.tolist()]
+    self.triangles = []
+    self.adjacent = []
+    self.free = []
+    self.last = None
+
+    self.vertexTriangle = [None] * len(sites)
+    self.buckets = {}
+    extent = np.ptp(sites, axis=0) if len(sites) else np.zeros(2)
+    self.bucketSize = max(2 * (extent[0] * extent[1] / max(len(sites), 1)) ** 0.5,
+                          extent.max() / max(len(sites), 1)) or 1.0
+
+    # Ids of points that coincide with an earlier point, mapped to that point.
+    # Of the sites given, the one with the lowest id is kept.
+    self.duplicates = {}
+    kept = np.setdiff1d(np.arange(len(sites)), list(removed))
+    _, first, inverse = np.unique(sites[kept], axis=0, return_index=True, return_inverse=True)
+    first = kept[first]
+    owner = first[inverse.ravel()]
+    for v, u in zip(kept[owner != kept].tolist(), owner[owner != kept].tolist()):
+      self.duplicates[v] = u
+
+    order = self.insertionOrder(sites[first], np.random.default_rng(seed))
+    order = first[order].tolist()
+    order = self.start(order)
+    for v in order:
+      self.insert(v)
+
+  def insertionOrder(self, sites, rng):
+    """Return ids of sites in biased randomised insertion order."""
+    order = rng.permutation(len(sites))
+    rounds = []
+    while len(order) > 64:
+      half = len(order) // 2
+      rounds.append(order[half:])
+      order = order[:half]
+    rounds.append(order)
+
+    result = []
+    for ids in reversed(rounds):
+      if len(ids) == 0:
+        continue
+      pts = sites[ids]
+      lo = pts.min(axis=0)
+      span = np.maximum(pts.max(axis=0) - lo, 1e-300)
+      cells = max(int(len(ids) ** 0.5 / 2), 1)
+      col = np.minimum(((pts[:, 0] - lo[0]) / span[0] * cells).astype(np.int64), cells - 1)
+      row = np.minimum(((pts[:, 1] - lo[1]) / span[1] * cells).astype(np.int64), cells - 1)
+
+      # snake through the rows of the grid, so that the walk never jumps back
+      col = np.where(row % 2 == 1, cells - 1 - col, col)
+      result.extend(ids[np.lexsort((col, row))].tolist())
+    return result
+
+  def start(self, order):
+    """
+    Create first triangle, and its ghosts, from the first three points in order that
+    are not collinear. Returns the points left to insert, or none at all if every
+    point is on one line.
+    """
+    if len(order) < 3:
+      return []
+
+    a, b = order[0], order[1]
+    for k in range(1, len(order)):
+      if self.points[order[k]] != self.points[a]:
+        b = order[k]
+        break
+    else:
+      return []
+
+    for c in order:
+      turn = orient2d(self.points[a], self.points[b], self.points[c])
+      if turn != 0:
+        break
+    else:
+      return []
+
+    if turn < 0:
+      a, b = b, a
+
+    t = self.newTriangle(a, b, c)
+    for v in (a, b, c):
+      self.vertexTriangle[v] = t
+      self.buckets[self.bucket(self.points[v])] = v
+    ghosts = [self.newTriangle(b, a, infinite), self.newTriangle(c, b, infinite),
+              self.newTriangle(a, c, infinite)]
+
+    # ghost of edge (u, v) is across from the vertex opposite that edge
+    self.link(t, 2, ghosts[0], 2)
+    self.link(t, 0, ghosts[1], 2)
+    self.link(t, 1, ghosts[2], 2)
+    self.link(ghosts[0], 0, ghosts[2], 1)
+    self.link(ghosts[1], 0, ghosts[0], 1)
+    self.link(ghosts[2], 0, ghosts[1], 1)
+    self.last = t
+
+    return [v for v in order if v not in (a, b, c)]
+
+  def newTriangle(self, a, b, c):
+    if self.free:
+      t = self.free.pop()
+      self.triangles[3 * t:3 * t + 3] = (a, b, c)
+      return t
+
+    self.triangles.extend((a, b, c))
+    self.adjacent.extend((None, None, None))
+    return len(self.triangles) // 3 - 1
+
+  def link(self, t, i, u, j):
+    """Make t and u adjacent across the edge opposite vertex i of t and vertex j of u."""
+    self.adjacent[3 * t + i] = u
+    self.adjacent[3 * u + j] = t
+
+  def bucket(self, p):
+    return int(p.x // self.bucketSize), int(p.y // self.bucketSize)
+
+  def addPoint(self, p):
+    """Add point p, given as (x,y), without inserting it yet. Returns its vertex id."""
+    self.points.append(Point(p))
+    self.vertexTriangle.append(None)
+    return len(self.points) - 1
+
+  def nearTriangle(self, p):
+    """Return a triangle close to p to start a walk from."""
+    bx, by = self.bucket(p)
+    for dx, dy in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)):
+      v = self.buckets.get((bx + dx, by + dy))
+      if v is not None:
+        return self.vertexTriangle[v]
+    return self.last
+
+  def isGhost(self, t):
+    return infinite in self.triangles[3 * t:3 * t + 3]
+
+  def __iter__(self):
+    """Yield ids of live finite triangles."""
+    dead = set(self.free)
+    for t in range(len(self.triangles) // 3):
+      if t not in dead and not self.isGhost(t):
+        yield t
+
+  def vertices(self, t):
+    return self.triangles[3 * t:3 * t + 3]
+
+  def conflicts(self, t, p):
+    """True if p is strictly inside the circumcircle of t."""
+    return self.inCircle(*self.triangles[3 * t:3 * t + 3], p)
+
+  def inCircle(self, a, b, c, p):
+    """True if p is strictly inside the circumcircle of triangle (a, b, c)."""
+    if infinite in (a, b, c):
+      # rotate so the finite edge runs a -> b, with the outside of the hull on its left
+      while c != infinite:
+        a, b, c = b, c, a
+      pa, pb = self.points[a], self.points[b]
+      turn = orient2d(pa, pb, p)
+      if turn != 0:
+        return turn > 0
+      # on the line of a hull edge, which is only in the circumcircle between a and b
+      return (pa.x - p.x) * (pb.x - p.x) + (pa.y - p.y) * (pb.y - p.y) < 0
+
+    return incircle(self.points[a], self.points[b], self.points[c], p) > 0
+
+  def locate(self, p, t=None):
+    """
+    Walk from triangle t, by default the last one created, to a triangle containing p.
+    If p is outside the convex hull, returns a ghost triangle whose hull edge p can see.
+    """
+    if t is None:
+      t = self.last
+
+    while True:
+      tri = self.triangles[3 * t:3 * t + 3]
+      if infinite in tri:
+        if self.conflicts(t, p):
+          return t
+        # step back into the hull, across the only finite edge
+        t = self.adjacent[3 * t + tri.index(infinite)]
+        continue
+
+      for i in range(3):
+        a = self.points[tri[(i + 1) % 3]]
+        b = self.points[tri[(i + 2) % 3]]
+        if orient2d(a, b, p) < 0:
+          t = self.adjacent[3 * t + i]
+          break
+      else:
+        return t
+
+  def insert(self, v, near=False):
+    """
+    Insert vertex v, walking from the last triangle created or, with near, from a
+    vertex close by. Returns ids of the triangles created, and the vertices of the
+    triangles removed by their ids, which may be reused by those created. Both are
+    empty if v is a duplicate of a lower vertex.
+    """
+    p = self.points[v]
+    t = self.locate(p, self.nearTriangle(p) if near else None)
+    for u in self.triangles[3 * t:3 * t + 3]:
+      if u != infinite and self.points[u] == p:
+        if u < v:
+          self.duplicates[v] = u
+          return [], {}
+        return self.replace(u, v)
+
+    # Grow cavity of triangles in conflict with p, which is star shaped around p.
+    cavity = {t}
+    stack = [t]
+    boundary = []
+    while stack:
+      t = stack.pop()
+      tri = self.triangles[3 * t:3 * t + 3]
+      for i in range(3):
+        u = self.adjacent[3 * t + i]
+        if u in cavity:
+          continue
+        if self.conflicts(u, p):
+          cavity.add(u)
+          stack.append(u)
+        else:
+          j = self.adjacent[3 * u:3 * u + 3].index(t)
+          boundary.append((tri[(i + 1) % 3], tri[(i + 2) % 3], u, j))
+
+    # Fill the cavity with a fan of triangles (a, b, v), one per boundary edge.
+    removed = {t: tuple(self.triangles[3 * t:3 * t + 3]) for t in cavity}
+    self.free.extend(cavity)
+    created = []
+    starting = {}
+    for a, b, u, j in boundary:
+      n = self.newTriangle(a, b, v)
+      self.link(n, 2, u, j)
+      starting[a] = n
+      created.append(n)
+
+    for n in created:
+      m = starting[self.triangles[3 * n + 1]]
+      self.link(n, 0, m, 1)
+      if self.triangles[3 * n] != infinite:
+        self.vertexTriangle[self.triangles[3 * n]] = n
+
+    self.vertexTriangle[v] = created[-1]
+    self.buckets[self.bucket(p)] = v
+    self.last = created[-1]
+    return created, removed
+
+  def remove(self, v):
+    """
+    Remove vertex v. The triangles around it are replaced by a triangulation of the
+    hole, built by clipping ears whose circumcircle holds no vertex of the hole, which
+    makes it Delaunay. For a vertex on the hull, the hole includes the vertex at
+    infinity, so ears with it become ghost triangles of the new hull. Returns the
+    triangles created and removed like insert, or None if the points left would all
+    be on one line, leaving the triangulation untouched.
+    """
+    if v in self.duplicates:
+      del self.duplicates[v]
+      return [], {}
+
+    # the ring of vertices around v, and the triangle outside each edge of the ring
+    # with the index of its opposite vertex
+    star = self.star(v)
+    ring = []
+    outside = {}
+    for t in star:
+      tri = self.triangles[3 * t:3 * t + 3]
+      i = tri.index(v)
+      a, b = tri[(i + 1) % 3], tri[(i + 2) % 3]
+      u = self.adjacent[3 * t + i]
+      ring.append(a)
+      outside[a, b] = (u, self.adjacent[3 * u:3 * u + 3].index(t))
+
+    finite = [u for u in ring if u != infinite]
+    if all(self.isGhost(u) for u, _ in outside.values()) and \
+        all(orient2d(self.points[finite[0]], self.points[finite[1]], self.points[w]) == 0
+            for w in finite[2:]):
+      return None
+
+    removed = {t: tuple(self.triangles[3 * t:3 * t + 3]) for t in star}
+    self.free.extend(star)
+
+    created = []
+    hole = ring
+    while True:
+      if len(hole) == 3:
+        k = 1
+      else:
+        k = next(k for k in range(len(hole)) if self.isEar(hole[k - 1], hole[k],
+                                                           hole[(k + 1) % len(hole)], finite))
+      a, b, c = hole[k - 1], hole[k], hole[(k + 1) % len(hole)]
+      n = self.newTriangle(a, b, c)
+      self.link(n, 2, *outside.pop((a, b)))
+      self.link(n, 0, *outside.pop((b, c)))
+      created.append(n)
+      if len(hole) == 3:
+        self.link(n, 1, *outside.pop((c, a)))
+        break
+      outside[a, c] = (n, 1)
+      del hole[k]
+
+    for n in created:
+      for u in self.triangles[3 * n:3 * n + 3]:
+        if u != infinite:
+          self.vertexTriangle[u] = n
+
+    self.vertexTriangle[v] = None
+    if self.buckets.get(self.bucket(self.points[v])) == v:
+      del self.buckets[self.bucket(self.points[v])]
+    self.last = created[-1]
+
+    # a duplicate of v takes its place
+    twins = sorted(d for d, u in self.duplicates.items() if u == v)
+    if twins:
+      for d in twins[1:]:
+        self.duplicates[d] = twins[0]
+      del self.duplicates[twins[0]]
+      more, gone = self.insert(twins[0], near=True)
+      removed.update((t, vs) for t, vs in gone.items() if t not in created)
+      created = [n for n in created if n not in gone] + more
+    return created, removed
+
+  def move(self, sites, limit=None):
+    """
+    Move every vertex to its row of sites, an n x 2 array, and make the triangulation
+    Delaunay again. Edges are flipped where they stopped being Delaunay, and vertices
+    of triangles that would turn over are taken out first and put back in at their
+    new position once the others moved. Returns the vertices of every triangle
+    changed by its id, as it was before the move, and the number of flips. Returns
+    None if duplicates came apart, the sites left would all be on one line, or more
+    than limit flips and vertices put back were needed. The triangulation is then
+    of no further use.
+    """
+    moved = [Point(p) for p in sites.tolist()]
+    if any(moved[v] != moved[u] for v, u in self.duplicates.items()):
+      return None
+
+    triangles = np.array(self.triangles, dtype=np.int64).reshape(-1, 3)
+    live = np.ones(len(triangles), dtype=bool)
+    live[self.free] = False
+    finite = np.nonzero(live & (triangles != infinite).all(axis=1))[0]
+
+    old = np.array([(p.x, p.y) for p in self.points], dtype=float).reshape(-1, 2)
+    late = set()
+    while True:
+      coords = sites.copy()
+      coords[list(late)] = old[list(late)]
+      self.points = moved[:]
+      for v in late:
+        self.points[v] = Point(old[v])
+
+      turned = self.turned(coords, triangles[finite])
+      if not turned:
+        break
+      late.update(triangles[finite[turned]].ravel().tolist())
+      if limit is not None and len(late) > limit:
+        return None
+
+    t, i, _, sign = self.edgeSigns(coords)
+    edges = list(zip(t[sign > 0].tolist(), i[sign > 0].tolist()))
+    # edges between ghosts, which flip where the hull stopped being convex
+    for g in np.nonzero(live & (triangles == infinite).any(axis=1))[0].tolist():
+      edges.extend((g, k) for k in range(3) if self.triangles[3 * g + k] != infinite)
+
+    result = self.legalize(edges, None if limit is None else limit - len(late))
+    if result is None:
+      return None
+    changed, flips = result
+
+    ids = [v for v, t in enumerate(self.vertexTriangle) if t is not None]
+    cells = (sites[ids] // self.bucketSize).astype(np.int64).tolist()
+    self.buckets = {(x, y): v for (x, y), v in zip(cells, ids)}
+    for v in sorted(late):
+      update = self.remove(v)
+      if update is None:
+        return None
+      self.points[v] = moved[v]
+      for t, vs in update[1].items():
+        changed.setdefault(t, vs)
+      for t, vs in self.insert(v, near=True)[1].items():
+        changed.setdefault(t, vs)
+    return changed, flips
+
+  def turned(self, coords, triangles):
+    """
+    Return positions in triangles, k x 3 rows of vertex ids, of those that are not
+    counter clockwise at coords, using the float filter of orient2d.
+    """
+    a, b, c = (coords[triangles[:, k]] for k in range(3))
+    left = (a[:, 0] - c[:, 0]) * (b[:, 1] - c[:, 1])
+    right = (a[:, 1] - c[:, 1]) * (b[:, 0] - c[:, 0])
+    unsure = np.nonzero(left - right <= ccwErrBound * (np.abs(left) + np.abs(right)))[0]
+    return [k for k in unsure.tolist()
+            if orient2d(*(self.points[v] for v in triangles[k].tolist())) <= 0]
+
+  def edgeSigns(self, coords=None):
+    """
+    Test every edge between two finite triangles against the circumcircle of one of
+    them at once, with array operations and the float filter of incircle, and exact
+    arithmetic only where it cannot tell. Returns arrays of the triangles t, the
+    index i of the vertex of t opposite the edge, the triangles u across it, and the
+    sign of incircle for the vertex of u across the edge: positive if it is inside the
+    circumcircle of t, zero if on it. Coords may give the points as n x 2 array.
+    """
+    triangles = np.array(self.triangles, dtype=np.int64).reshape(-1, 3)
+    adjacent = np.array(self.adjacent, dtype=np.int64).reshape(-1, 3)
+    live = np.ones(len(triangles), dtype=bool)
+    live[self.free] = False
+    finite = live & (triangles != infinite).all(axis=1)
+
+    t, i = np.nonzero(finite[:, None] & (adjacent > np.arange(len(triangles))[:, None]))
+    u = adjacent[t, i]
+    keep = finite[u]
+    t, i, u = t[keep], i[keep], u[keep]
+    j = np.argmax(adjacent[u] == t[:, None], axis=1)
+
+    points = coords
+    if points is None:
+      points = np.array([(p.x, p.y) for p in self.points], dtype=float).reshape(-1, 2)
+    d = points[triangles[u, j]]
+    a, b, c = (points[triangles[t, k]] - d for k in range(3))
+    alift, blift, clift = ((q ** 2).sum(axis=1) for q in (a, b, c))
+    bc, ca, ab = (p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1] for p, q in ((b, c), (c, a), (a, b)))
+    det = alift * bc + blift * ca + clift * ab
+    permanent = (alift * (np.abs(b[:, 0] * c[:, 1]) + np.abs(c[:, 0] * b[:, 1])) +
+                 blift * (np.abs(c[:, 0] * a[:, 1]) + np.abs(a[:, 0] * c[:, 1])) +
+                 clift * (np.abs(a[:, 0] * b[:, 1]) + np.abs(b[:, 0] * a[:, 1])))
+
+    sign = np.sign(det)
+    for k in np.nonzero(np.abs(det) <= iccErrBound * permanent)[0].tolist():
+      sign[k] = np.sign(incircle(*(self.points[v] for v in triangles[t[k]].tolist()),
+                                 self.points[triangles[u[k], j[k]]]))
+    return t, i, u, sign
+
+  def legalize(self, edges, limit=None):
+    """
+    Flip edges, given as (t, i) for the edge of t opposite its vertex i, that are not
+    locally Delaunay, checking the edges around every flip in turn. Returns the
+    vertices of the triangles flipped by their id, as they were before their first
+    flip, and the number of flips, or None once more than limit flips are needed.
+    """
+    flipped = {}
+    flips = 0
+    stack = list(edges)
+    while stack:
+      t, i = stack.pop()
+      u = self.adjacent[3 * t + i]
+      p = self.triangles[3 * t + i]
+      s = self.triangles[3 * u + self.adjacent[3 * u:3 * u + 3].index(t)]
+      if s == infinite:
+        legal = not self.conflicts(u, self.points[p])
+      else:
+        legal = not self.conflicts(t, self.points[s])
+      if legal:
+        continue
+
+      if limit is not None and flips >= limit:
+        return None
+      for w in (t, u):
+        flipped.setdefault(w, tuple(self.triangles[3 * w:3 * w + 3]))
+      self.flip(t, i)
+      flips += 1
+      stack.extend(((t, 0), (t, 2), (u, 0), (u, 2)))
+    return flipped, flips
+
+  def flip(self, t, i):
+    """
+    Flip the edge of t opposite its vertex p = triangles[3t + i]. Triangles (p, q, r)
+    and (s, r, q) on either side become (p, q, s) and (s, r, p), keeping their ids.
+    """
+    p, q, r = (self.triangles[3 * t + (i + k) % 3] for k in range(3))
+    u = self.adjacent[3 * t + i]
+    j = self.adjacent[3 * u:3 * u + 3].index(t)
+    s = self.triangles[3 * u + j]
+
+    # triangles outside the four edges of the quadrilateral, with their index back
+    outside = []
+    for w, k in ((u, (j + 1) % 3), (t, (i + 2) % 3), (t, (i + 1) % 3), (u, (j + 2) % 3)):
+      n = self.adjacent[3 * w + k]
+      outside.append((n, self.adjacent[3 * n:3 * n + 3].index(w)))
+
+    self.triangles[3 * t:3 * t + 3] = (p, q, s)
+    self.triangles[3 * u:3 * u + 3] = (s, r, p)
+    self.link(t, 0, *outside[0])
+    self.link(t, 1, u, 1)
+    self.link(t, 2, *outside[1])
+    self.link(u, 0, *outside[2])
+    self.link(u, 2, *outside[3])
+    for v, w in ((p, t), (q, t), (r, u), (s, u)):
+      if v != infinite:
+        self.vertexTriangle[v] = w
+
+  def star(self, v):
+    """Return the triangles around vertex v, counter clockwise."""
+    star = []
+    first = t = self.vertexTriangle[v]
+    while True:
+      star.append(t)
+      i = self.triangles[3 * t:3 * t + 3].index(v)
+      t = self.adjacent[3 * t + (i + 1) % 3]
+      if t == first:
+        return star
+
+  def replace(self, u, v):
+    """
+    Put vertex v in the place of its duplicate u, which becomes a duplicate of v.
+    Returns the triangles around it as both created and removed, like insert.
+    """
+    star = self.star(u)
+    removed = {t: tuple(self.triangles[3 * t:3 * t + 3]) for t in star}
+    for t in star:
+      self.triangles[3 * t + self.triangles[3 * t:3 * t + 3].index(u)] = v
+
+    for d, w in self.duplicates.items():
+      if w == u:
+        self.duplicates[d] = v
+    self.duplicates[u] = v
+    self.vertexTriangle[v] = self.vertexTriangle[u]
+    self.vertexTriangle[u] = None
+    if self.buckets.get(self.bucket(self.points[v])) == u:
+      self.buckets[self.bucket(self.points[v])] = v
+    return star, removed
+
+  def isEar(self, a, b, c, candidates):
+    """True if (a, b, c) is a Delaunay triangle of a hole with vertices candidates."""
+    if infinite not in (a, b, c) and orient2d(self.points[a], self.points[b], self.points[c]) <= 0:
+      return False
+    return not any(self.inCircle(a, b, c, self.points[w]) for w in candidates if w not in (a, b, c))
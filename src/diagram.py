@@ -0,0 +1,290 @@
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# Diagram files start with a header: magic, format version, number of arrays, width
+# and height, then the byte offset and length of each array, in the order of
+# diagramArrays. Every array starts on a 64 byte boundary, little endian.
+diagramMagic = b'VORONOI\x00'
+diagramVersion = 1
+diagramHeader = struct.Struct('<8sIIdd')
+diagramArrays = (('sites', '<f8', 2), ('vertices', '<f8', 2), ('edges', '<i8', 2),
+                 ('edgeSites', '<i8', 2), ('cellOffsets', '<i8', 1), ('cellIndices', '<i8', 1))
+
+
+class Diagram:
+  """
+  Columnar view of a computed Voronoi Diagram, with every component held in
+  contiguous arrays so it can be analysed or plotted without touching the
+  Point/Edge objects of the sweep.
+
+    sites        n x 2 site coordinates, row i is site (cell) i
+    vertices     V x 2 coordinates of Voronoi vertices
+    edges        E x 2 vertex ids of the endpoints of each edge
+    edgeSites    E x 2 ids of the sites on the left and right of each edge
+    cellOffsets  n + 1 offsets into cellIndices (CSR layout)
+    cellIndices  vertex ids of every cell, counter clockwise around its site
+
+  Vertices of cell i are cellIndices[cellOffsets[i]:cellOffsets[i + 1]].
+  """
+
+  def __init__(self, sites, vertices, edges, edgeSites, cellOffsets, cellIndices, width, height):
+    self.sites = sites
+    self.vertices = vertices
+    self.edges = edges
+    self.edgeSites = edgeSites
+    self.cellOffsets = cellOffsets
+    self.cellIndices = cellIndices
+    self.width = width
+    self.height = height
+
+  def __len__(self):
+    return len(self.sites)
+
+  def cell(self, i):
+    """Return coordinates of the vertices of cell i, counter clockwise."""
+    return self.vertices[self.cellIndices[self.cellOffsets[i]:self.cellOffsets[i + 1]]]
+
+  def edgeCoordinates(self):
+    """Return E x 2 x 2 array with the coordinates of both endpoints of each edge."""
+    return self.vertices[self.edges]
+
+  def save(self, path):
+    """
+    Write the diagram to path in the binary diagram format, which loadDiagram maps
+    back into memory without reading it.
+    """
+    arrays = [np.ascontiguousarray(getattr(self, name), dtype=dtype) for name, dtype, _ in diagramArrays]
+    offset = align(diagramHeader.size + 16 * len(arrays))
+    table = []
+    for array in arrays:
+      table += [offset, len(array)]
+      offset = align(offset + array.nbytes)
+
+    with open(path, 'wb') as f:
+      f.write(diagramHeader.pack(diagramMagic, diagramVersion, len(arrays), self.width, self.height))
+      f.write(struct.pack('<%dQ' % len(table), *table))
+      for array, start in zip(arrays, table[::2]):
+        f.write(bytes(start - f.tell()))
+        f.write(array.data)
+
+  def clip(self, box=None):
+    """
+    Return the cells and edges clipped to box (xmin, ymin, xmax, ymax), by default
+    [0, width] x [0, height], as a ClippedDiagram.
+
+    Ends of rays that finish put on the bounding box are vertices of a single edge.
+    Those ends are taken to be at infinity instead, so rays run from their other end
+    away from the site of another cell meeting there, and edges with no other end
+    are whole lines between their sites. All edges are then clipped at once, so any
+    box can be used, however far it is from the one the diagram was computed for.
+    Each cell is closed with the ends of its clipped edges and the corners of the box
+    nearest its site. A vertex of a single edge anywhere else, left dangling, raises
+    ValueError.
+    """
+    if box is None:
+      box = (0, 0, self.width, self.height)
+    xmin, ymin, xmax, ymax = box
+
+    starts, ends = self.vertices[self.edges[:, 0]], self.vertices[self.edges[:, 1]]
+    degree = np.bincount(self.edges.ravel(), minlength=len(self.vertices))
+    open_end = degree[self.edges] == 1
+
+    # any other vertex of a single edge would be taken to be at infinity as well
+    loose = self.vertices[self.edges[open_end]].reshape(-1, 2)
+    on_box = ((loose[:, 0] == 0) | (loose[:, 0] == self.width) |
+              (loose[:, 1] == 0) | (loose[:, 1] == self.height))
+    if not on_box.all():
+      raise ValueError('%d vertices of a single edge are not on the lines of the bounding box'
+                       % np.count_nonzero(~on_box))
+    line = open_end.all(axis=1)
+    ray = open_end.any(axis=1) & ~line
+
+    # some other edge at the finite end of each ray, and a site of it off the ray
+    finite = np.where(open_end[:, 0], self.edges[:, 1], self.edges[:, 0])
+    incident = np.argsort(self.edges.ravel(), kind='stable') // 2
+    first = np.cumsum(degree) - degree
+    other = np.where(incident[first[finite]] == np.arange(len(self.edges)),
+                     incident[np.minimum(first[finite] + 1, len(incident) - 1)], incident[first[finite]])
+    a, b = self.edgeSites[:, 0], self.edgeSites[:, 1]
+    c, d = self.edgeSites[other, 0], self.edgeSites[other, 1]
+    third = np.where((c == a) | (c == b), d, c)
+
+    left, right = self.sites[a], self.sites[b]
+    normal = np.column_stack([left[:, 1] - right[:, 1], right[:, 0] - left[:, 0]])
+    away = ((self.sites[third] - left) * normal).sum(axis=1) > 0
+    normal = np.where((ray & away)[:, None], -normal, normal)
+
+    # Every edge lies on the bisector of its sites, so is traced from their midpoint.
+    # Vertices far away, of nearly collinear sites, then only bound the range of the
+    # edge, instead of losing the precision of where it crosses the box.
+    origin = (left + right) / 2
+    scale = np.maximum((normal ** 2).sum(axis=1), np.finfo(float).tiny)
+    t_start = ((starts - origin) * normal).sum(axis=1) / scale
+    t_end = ((ends - origin) * normal).sum(axis=1) / scale
+    backwards = ~(ray | line) & (t_end < t_start)
+    direction = np.where(backwards[:, None], -normal, normal)
+    t_start, t_end = np.where(backwards, -t_start, t_start), np.where(backwards, -t_end, t_end)
+    t_finite = ((self.vertices[finite] - origin) * normal).sum(axis=1) / scale
+    t0 = np.where(line, -np.inf, np.where(ray, t_finite, t_start))
+    t1 = np.where(ray | line, np.inf, t_end)
+    first, last = np.where(ray[:, None], self.vertices[finite], starts), ends
+    starts, ends, inside = clipLines(origin, direction, t0, t1, box)
+
+    # ends inside the box stay at their vertex exactly, to match the other edges there
+    for end, vertex, bounded in ((starts, first, ~line), (ends, last, ~(ray | line))):
+      within = bounded & ((vertex >= (xmin, ymin)) & (vertex <= (xmax, ymax))).all(axis=1)
+      end[within] = vertex[within]
+
+    # box corners belong to the nearest site with a cell
+    live = np.unique(self.edgeSites) if len(self.edgeSites) else np.arange(min(len(self.sites), 1))
+    corners = np.array([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)], dtype=float)
+    if len(live):
+      nearest = live[np.argmin(((corners[:, None] - self.sites[live][None]) ** 2).sum(axis=2), axis=1)]
+    else:
+      nearest, corners = np.empty(0, dtype=np.int64), np.empty((0, 2))
+
+    cell = np.concatenate([self.edgeSites[inside, 0], self.edgeSites[inside, 0],
+                           self.edgeSites[inside, 1], self.edgeSites[inside, 1], nearest])
+    points = np.concatenate([starts[inside], ends[inside], starts[inside], ends[inside], corners])
+
+    # cells are convex, so their corners go counter clockwise around their mean, and
+    # corners found from more than one edge come out next to each other
+    counts = np.bincount(cell, minlength=len(self.sites))
+    center = np.column_stack([np.bincount(cell, points[:, k], len(self.sites)) for k in range(2)])
+    center = center / np.maximum(counts, 1)[:, None]
+    delta = points - center[cell]
+    order = np.lexsort((np.arctan2(delta[:, 1], delta[:, 0]), cell))
+    cell, points = cell[order], points[order]
+    repeat = np.zeros(len(cell), dtype=bool)
+    repeat[1:] = (cell[1:] == cell[:-1]) & (points[1:] == points[:-1]).all(axis=1)
+    cell, points = cell[~repeat], points[~repeat]
+
+    offsets = np.zeros(len(self.sites) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell, minlength=len(self.sites)), out=offsets[1:])
+    edges = inside & (starts != ends).any(axis=1)
+    return ClippedDiagram(self.sites, box, np.stack([starts[edges], ends[edges]], axis=1),
+                          self.edgeSites[edges], offsets, points)
+
+
+class ClippedDiagram:
+  """
+  Cells and edges of a Diagram clipped to a box, as coordinates.
+
+    sites         n x 2 site coordinates
+    box           (xmin, ymin, xmax, ymax)
+    edges         E x 2 x 2 coordinates of both endpoints of each edge in the box
+    edgeSites     E x 2 ids of the sites on the left and right of each edge
+    cellOffsets   n + 1 offsets into cellVertices (CSR layout)
+    cellVertices  vertex coordinates of every cell, counter clockwise
+
+  Cells outside the box, and sites without a cell, have no vertices.
+  """
+
+  def __init__(self, sites, box, edges, edgeSites, cellOffsets, cellVertices):
+    self.sites = sites
+    self.box = box
+    self.edges = edges
+    self.edgeSites = edgeSites
+    self.cellOffsets = cellOffsets
+    self.cellVertices = cellVertices
+
+  def __len__(self):
+    return len(self.sites)
+
+  def cell(self, i):
+    """Return coordinates of the vertices of cell i, counter clockwise."""
+    return self.cellVertices[self.cellOffsets[i]:self.cellOffsets[i + 1]]
+
+
+def loadDiagram(path):
+  """
+  Return the Diagram saved in path. Its arrays are read only views of the file
+  mapped into memory, so loading takes the same time whatever the size of the
+  diagram, and processes loading the same file share its pages.
+  """
+  with open(path, 'rb') as f:
+    if os.fstat(f.fileno()).st_size < diagramHeader.size:
+      raise ValueError('%s is not a diagram file' % (path,))
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+  if data[:len(diagramMagic)] != diagramMagic:
+    raise ValueError('%s is not a diagram file' % (path,))
+  _, version, count, width, height = diagramHeader.unpack_from(data)
+  if version > diagramVersion:
+    raise ValueError('%s has diagram format version %d, newer than %d' % (path, version, diagramVersion))
+  if count < len(diagramArrays):
+    raise ValueError('%s has a corrupt header: %d arrays, fewer than %d' % (path, count, len(diagramArrays)))
+  if diagramHeader.size + 16 * count > len(data):
+    raise ValueError('%s is truncated' % (path,))
+
+  table = struct.unpack_from('<%dQ' % (2 * count), data, diagramHeader.size)
+  arrays = []
+  for (name, dtype, columns), offset, rows in zip(diagramArrays, table[::2], table[1::2]):
+    if offset + rows * columns * 8 > len(data):
+      raise ValueError('%s is truncated' % (path,))
+    array = np.frombuffer(data, dtype=dtype, count=rows * columns, offset=offset)
+    arrays.append(array.reshape(rows, columns) if columns > 1 else array)
+
+  return Diagram(*arrays, width, height)
+
+
+def align(offset):
+  """Round offset up to a multiple of 64 bytes."""
+  return -(-offset // 64) * 64
+
+
+def buildCells(sites, vertices, edges, edgeSites):
+  """
+  Compute CSR cell arrays from edges: each edge adds both of its endpoints to the
+  cells on either side, then vertices of each cell are ordered by angle around
+  its site.
+  """
+  cell = np.concatenate([edgeSites[:, 0], edgeSites[:, 0], edgeSites[:, 1], edgeSites[:, 1]])
+  vertex = np.concatenate([edges[:, 0], edges[:, 1], edges[:, 0], edges[:, 1]])
+
+  pairs = np.unique(np.stack([cell, vertex], axis=1), axis=0).reshape(-1, 2)
+  cell, vertex = pairs[:, 0], pairs[:, 1]
+  delta = vertices[vertex] - sites[cell]
+  angle = np.arctan2(delta[:, 1], delta[:, 0])
+  order = np.lexsort((angle, cell))
+
+  offsets = np.zeros(len(sites) + 1, dtype=np.int64)
+  np.cumsum(np.bincount(cell, minlength=len(sites)), out=offsets[1:])
+  return offsets, vertex[order]
+
+
+def clipSegments(starts, ends, width, height):
+  """
+  Clip segments from starts to ends (both k x 2 arrays) to the box [0, width] x
+  [0, height]. Returns the clipped starts and ends, and a mask of the segments that
+  cross the box at all.
+  """
+  return clipLines(starts, ends - starts, np.zeros(len(starts)), np.ones(len(starts)),
+                   (0, 0, width, height))
+
+
+def clipLines(origins, directions, t0, t1, box):
+  """
+  Clip the parts of lines origin + t * direction (k x 2 arrays) with t from t0 to t1,
+  which may be infinite, to box (xmin, ymin, xmax, ymax) with the Liang-Barsky
+  algorithm. Returns the clipped starts and ends, and a mask of the lines that
+  cross the box at all.
+  """
+  xmin, ymin, xmax, ymax = box
+  inside = np.ones(len(origins), dtype=bool)
+  for p, q in ((-directions[:, 0], origins[:, 0] - xmin), (directions[:, 0], xmax - origins[:, 0]),
+               (-directions[:, 1], origins[:, 1] - ymin), (directions[:, 1], ymax - origins[:, 1])):
+    parallel = p == 0
+    inside &= ~(parallel & (q < 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+      t = q / p
+    t0 = np.where(~parallel & (p < 0), np.maximum(t0, t), t0)
+    t1 = np.where(~parallel & (p > 0), np.minimum(t1, t), t1)
+
+  inside &= t0 <= t1
+  t0 = np.where(inside, t0, 0)
+  t1 = np.where(inside, t1, 0)
+  return origins + t0[:, None] * directions, origins + t1[:, None] * directions, inside
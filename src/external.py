@@ -0,0 +1,105 @@
+import os
+import tempfile
+
+import numpy as np
+
+# Number of sites sorted in memory at a time by sortedChunks, unless told otherwise.
+chunkSites = 1 << 20
+
+# Records of a sorted run: the sweep key -y, then x, then the site id.
+runType = np.dtype([('key', '<f8'), ('x', '<f8'), ('id', '<i8')])
+
+
+def openSites(path):
+  """
+  Open the sites in path as an n x 2 memory map, without reading them. A .npy file
+  is opened as saved, anything else is taken as raw little endian float64 x,y pairs.
+  """
+  if str(path).endswith('.npy'):
+    sites = np.load(path, mmap_mode='r')
+  else:
+    size = os.path.getsize(path)
+    if size % 16:
+      raise ValueError('raw sites must be float64 (x,y) pairs, got %d bytes' % size)
+    sites = np.memmap(path, dtype='<f8', mode='r', shape=(size // 16, 2)) if size else np.empty((0, 2))
+
+  if sites.ndim != 2 or sites.shape[1] != 2:
+    raise ValueError('points must be given as (x,y) pairs, got shape %s' % (sites.shape,))
+  return sites
+
+
+def sortedChunks(sites, chunksize=chunkSites, directory=None):
+  """
+  Yield the sites of an n x 2 array, usually a memory map, in sweep order as chunks
+  (coordinates, ids) of at most chunksize sites. Ties keep the order of the ids.
+
+  This is an external merge sort. Chunks of chunksize sites are sorted in memory and
+  written out as runs to a temporary directory in directory, removed once done. The
+  runs are then merged a block from each at a time: everything up to the smallest of
+  the last keys read from runs not yet exhausted is in place, and goes out sorted.
+  Memory stays in proportion to chunksize whatever the number of sites.
+  """
+  if len(sites) <= chunksize:
+    block = checkSites(sites[:])
+    order = np.lexsort((block[:, 0], -block[:, 1]))
+    if len(order):
+      yield block[order], order
+    return
+
+  with tempfile.TemporaryDirectory(dir=directory) as scratch:
+    runs = []
+    for k in range(0, len(sites), chunksize):
+      block = checkSites(sites[k:k + chunksize])
+      order = np.lexsort((block[:, 0], -block[:, 1]))
+      run = np.empty(len(block), dtype=runType)
+      run['key'] = -block[order, 1]
+      run['x'] = block[order, 0]
+      run['id'] = order + k
+      runs.append(os.path.join(scratch, 'run%d.npy' % len(runs)))
+      np.save(runs[-1], run)
+      del block, order, run
+
+    yield from mergeRuns([np.load(run, mmap_mode='r') for run in runs], chunksize)
+
+
+def mergeRuns(runs, chunksize):
+  """Merge sorted runs of runType records, yielding chunks (coordinates, ids)."""
+  step = max(chunksize // len(runs), 1)
+  cursors = [0] * len(runs)
+  last = [None] * len(runs)
+  pending = np.empty(0, dtype=runType)
+  # last record gone out, None until something has been read
+  bound = None
+  while True:
+    # read on from every run whose records read so far have all gone out
+    blocks = [pending]
+    for r, run in enumerate(runs):
+      if cursors[r] < len(run) and (bound is None or last[r] <= bound):
+        blocks.append(np.array(run[cursors[r]:cursors[r] + step]))
+        cursors[r] += len(blocks[-1])
+        last[r] = tuple(blocks[-1][-1].tolist())
+    pending = np.concatenate(blocks)
+    pending = pending[np.lexsort((pending['id'], pending['x'], pending['key']))]
+    if not len(pending):
+      return
+
+    live = [last[r] for r in range(len(runs)) if cursors[r] < len(runs[r])]
+    if live:
+      bound = min(live)
+      key, x, ident = bound
+      done = int(((pending['key'] < key) | (pending['key'] == key) & (
+        (pending['x'] < x) | (pending['x'] == x) & (pending['id'] <= ident))).sum())
+    else:
+      done = len(pending)
+
+    out, pending = pending[:done], pending[done:]
+    if len(out):
+      yield np.column_stack([out['x'], -out['key']]), out['id']
+
+
+def checkSites(block):
+  """Return block of sites as a float array, checking its coordinates are finite."""
+  block = np.asarray(block, dtype=float)
+  if not np.isfinite(block).all():
+    raise ValueError('points must have finite coordinates')
+  return block
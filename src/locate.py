@@ -0,0 +1,148 @@
+import numpy as np
+
+from src.parallel import workerPool
+
+
+class SiteIndex:
+  """
+  Index over the cells of a Diagram, answering which cell holds each of many points.
+
+  Sites are hashed into a uniform grid with about one site per grid cell, and each
+  grid cell records the site nearest its center. A query starts from the site of
+  its grid cell and walks to any neighbouring cell whose site is closer, until none
+  is. In a Voronoi diagram that site is the nearest one, as the segment from any
+  other site to the query leaves its cell towards a closer neighbour. All queries
+  walk together with array operations, and from a nearby start take a step or two.
+
+  Diagrams of processParallel and processTiled keep only the edges meeting their
+  box, so cells outside it may lack neighbours, and sites whose cells miss it have
+  none. Within the box the walk still holds, as each cell clipped to it is bounded
+  by those edges only. Queries outside the box are checked against every site with
+  a cell as well, which takes time in proportion to the number of sites.
+
+    sites       n x 2 site coordinates
+    offsets     n + 1 offsets into neighbours (CSR layout)
+    neighbours  ids of the sites of the cells sharing an edge with each cell
+    origin      lower left corner of the grid
+    size        side of a grid cell
+    shape       number of grid cells along x and y
+    starts      site nearest the center of each grid cell, row by row
+    live        ids of the sites with a cell
+    box         width and height of the box of the diagram
+
+  Sites without a cell, duplicates and removed sites, are never returned.
+  """
+
+  def __init__(self, diagram):
+    sites = np.asarray(diagram.sites, dtype=float).reshape(-1, 2)
+    pairs = np.concatenate([diagram.edgeSites, diagram.edgeSites[:, ::-1]]).reshape(-1, 2)
+    pairs = np.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0).reshape(-1, 2)
+
+    self.sites = sites
+    self.offsets = np.zeros(len(sites) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs[:, 0], minlength=len(sites)), out=self.offsets[1:])
+    self.neighbours = pairs[:, 1].copy()
+
+    # sites with a cell, or the only site there is
+    live = np.unique(pairs[:, 0]) if len(pairs) else np.arange(min(len(sites), 1))
+    if len(live) == 0:
+      raise ValueError('diagram has no sites to locate')
+    self.live = live
+    self.box = np.array([diagram.width, diagram.height], dtype=float)
+
+    lo = sites[live].min(axis=0)
+    extent = sites[live].max(axis=0) - lo
+    self.size = max((extent[0] * extent[1] / len(live)) ** 0.5, extent.max() / len(live)) or 1.0
+    self.origin = lo
+    self.shape = (np.floor(extent / self.size).astype(np.int64) + 1)
+
+    # walk to the center of every grid cell from a site in it, or in the nearest grid
+    # cell holding one along its row, or else its column
+    starts = np.full(self.shape[0] * self.shape[1], -1, dtype=np.int64)
+    starts[self.cellOf(sites[live])] = live
+    starts = starts.reshape(self.shape[1], self.shape[0])
+    starts = fillGaps(fillGaps(starts).T).T.ravel()
+    gx, gy = np.meshgrid(np.arange(self.shape[0]), np.arange(self.shape[1]))
+    centers = self.origin + (np.column_stack([gx.ravel(), gy.ravel()]) + 0.5) * self.size
+    self.starts = self.walk(centers, starts)
+
+  def cellOf(self, points):
+    """Return the grid cell of each of points, a k x 2 array, clamped to the grid."""
+    g = np.floor((points - self.origin) / self.size)
+    g = np.clip(np.nan_to_num(g), 0, self.shape - 1).astype(np.int64)
+    return g[:, 1] * self.shape[0] + g[:, 0]
+
+  def walk(self, points, current):
+    """Walk each of points from site current to the nearest site. Returns their ids."""
+    current = current.copy()
+    distance = ((points - self.sites[current]) ** 2).sum(axis=1)
+    active = np.arange(len(points))
+    while len(active):
+      at = current[active]
+      counts = self.offsets[at + 1] - self.offsets[at]
+      owner = np.repeat(np.arange(len(active)), counts)
+      first = np.cumsum(counts) - counts
+      neighbour = self.neighbours[np.repeat(self.offsets[at] - first, counts) + np.arange(counts.sum())]
+      d = ((points[active[owner]] - self.sites[neighbour]) ** 2).sum(axis=1)
+
+      nearest = np.full(len(active), np.inf)
+      np.minimum.at(nearest, owner, d)
+      best = np.empty(len(active), dtype=np.int64)
+      hit = d == nearest[owner]
+      best[owner[hit]] = neighbour[hit]
+
+      closer = nearest < distance[active]
+      active = active[closer]
+      current[active] = best[closer]
+      distance[active] = nearest[closer]
+    return current
+
+  def locate(self, points, workers=1, chunksize=1 << 20):
+    """
+    Return ids of the sites whose cells hold points, a k x 2 array. A point on the
+    boundary of two cells goes to either.
+
+    With workers other than 1, points are split into chunks of chunksize located in
+    parallel on the worker pool of processParallel, where None means one worker per
+    CPU. Every chunk carries a copy of the index, so chunks should be large.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if workers == 1 or len(points) <= chunksize:
+      return self.locateChunk(points)
+
+    executor = workerPool(workers)
+    jobs = [executor.submit(self.locateChunk, points[k:k + chunksize])
+            for k in range(0, len(points), chunksize)]
+    return np.concatenate([job.result() for job in jobs])
+
+  def locateChunk(self, points):
+    found = self.walk(points, self.starts[self.cellOf(points)])
+
+    # outside the box cells may have lost edges, so compare with every site there,
+    # a block of queries at a time, keeping what the walk found on near ties
+    outside = np.nonzero(~((points >= 0) & (points <= self.box)).all(axis=1))[0]
+    if len(outside) == 0:
+      return found
+    sites = self.sites[self.live] - self.origin
+    norms = (sites ** 2).sum(axis=1)
+    block = max((1 << 22) // len(self.live), 1)
+    for k in range(0, len(outside), block):
+      rows = outside[k:k + block]
+      near = points[rows] - self.origin
+      best = self.live[np.argmin(norms - 2 * near @ sites.T, axis=1)]
+      pair = self.sites[np.column_stack([best, found[rows]])]
+      distance = ((points[rows, None, :] - pair) ** 2).sum(axis=2)
+      closer = distance[:, 0] < distance[:, 1]
+      found[rows[closer]] = best[closer]
+    return found
+
+
+def fillGaps(grid):
+  """Fill each -1 in the rows of grid with the nearest other value in its row, if any."""
+  columns = np.arange(grid.shape[1])
+  before = np.maximum.accumulate(np.where(grid >= 0, columns, -1), axis=1)
+  after = np.minimum.accumulate(np.where(grid >= 0, columns, grid.shape[1])[:, ::-1], axis=1)[:, ::-1]
+  nearest = np.where((before >= 0) & ((after >= grid.shape[1]) | (columns - before <= after - columns)),
+                     before, after)
+  rows = np.arange(grid.shape[0])[:, None]
+  return np.where(nearest < grid.shape[1], grid[rows, np.minimum(np.maximum(nearest, 0), grid.shape[1] - 1)], -1)
@@ -0,0 +1,367 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import numpy as np
+
+from src.diagram import Diagram, buildCells, clipSegments
+
+# Worker processes are started once and kept for later calls.
+pool = None
+poolSize = None
+
+# Number of sites per tile aimed for by processTiles, unless told otherwise.
+tileSites = 250000
+
+
+def workerPool(workers=None):
+  """Return the persistent pool of worker processes, starting it on first use."""
+  global pool, poolSize
+  workers = workers or os.cpu_count()
+  if pool is None or poolSize != workers:
+    if pool is not None:
+      pool.shutdown()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    poolSize = workers
+  return pool
+
+
+def sweepTile(width, height, engine, sites, owned, bounds):
+  """
+  Compute diagram of the sites of one slab or tile together with its halo, in a
+  worker process.
+
+  Owned marks the sites of the tile itself, while bounds (xmin, ymin, xmax, ymax)
+  is the box all sites of the diagram in it were given for, with infinite sides
+  where there are no sites beyond. Returns the vertices, edges and (local) edge
+  sites of the diagram, for every owned site whether its cell is certain to be the
+  same as in the diagram of all sites, and how far beyond bounds sites would have
+  to be given to make them all certain.
+  """
+  from src.voronoi import Voronoi
+
+  voronoi = Voronoi(width, height, engine=engine)
+  voronoi.process(sites)
+  d = voronoi.diagram()
+
+  # The part of a cell inside the box is exact if, around each of its corners, the
+  # circle through the site lies within the bounds of the sites given, so no site
+  # left out could be closer. Corners are those of the cell clipped to the box, with
+  # ray ends on the box lines taken to be at infinity as everywhere else.
+  clipped = d.clip()
+  site = np.repeat(np.arange(len(sites)), np.diff(clipped.cellOffsets))
+  vertex = clipped.cellVertices
+
+  # more sites only shrink cells, so circles around their corners can only shrink
+  r = np.hypot(*(vertex - sites[site]).T)
+  beyond = np.max([bounds[0] - (vertex[:, 0] - r), bounds[1] - (vertex[:, 1] - r),
+                   vertex[:, 0] + r - bounds[2], vertex[:, 1] + r - bounds[3]], axis=0)
+  certified = np.ones(len(sites), dtype=bool)
+  certified[site[beyond > 0]] = False
+  reach = beyond[owned[site]].max(initial=0)
+
+  return d.vertices, d.edges, d.edgeSites, certified[owned], reach
+
+
+def processSlabs(voronoi, points, workers=None, slabs=None):
+  """
+  Compute diagram of points in parallel, returning it as a Diagram which is the same
+  as that of a serial run inside the bounding box.
+
+  Sites are split into vertical slabs with equal numbers of sites. Each slab is
+  swept in a worker process along with a halo of sites from the slabs next to it,
+  which is widened as far as the slab's cells could reach and swept again for
+  slabs with a cell the halo did not prove exact. The slabs are then merged by
+  mergeSlabs: every edge is taken from the slab owning the lower of its two site
+  ids, so from exactly one side, clipped to the bounding box.
+  """
+  sites = voronoi.prepareSites(points)
+  n = len(sites)
+  workers = workers or os.cpu_count()
+  slabs = slabs or workers
+
+  if slabs < 2 or n < 4 * slabs:
+    voronoi.process(sites)
+    return voronoi.diagram()
+
+  order = np.argsort(sites[:, 0], kind='stable')
+  owner = np.empty(n, dtype=np.int64)
+  bounds = np.array_split(order, slabs)
+  for k, ids in enumerate(bounds):
+    owner[ids] = k
+
+  pieces = sweepHalos(voronoi, sites, owner, slabs, workers, slabHalo, order, sites[order, 0], bounds)
+  return mergeSlabs(voronoi, sites, owner, pieces)
+
+
+def slabHalo(sites, k, halo, order, xs, bounds):
+  """
+  Return ids of the sites of slab k and of those within halo of it, with the bounds
+  they were given for. Order sorts sites by x, xs holds their x in that order and
+  bounds the ids of each slab, in the same order.
+  """
+  lo = sites[bounds[k][0], 0] - halo
+  hi = sites[bounds[k][-1], 0] + halo
+  # no site can be left out beyond the outermost sites
+  if lo <= xs[0]:
+    lo = -np.inf
+  if hi >= xs[-1]:
+    hi = np.inf
+  ids = order[np.searchsorted(xs, lo, 'left'):np.searchsorted(xs, hi, 'right')]
+  return ids, (lo, -np.inf, hi, np.inf)
+
+
+def processTiles(voronoi, points, workers=None, tiles=None):
+  """
+  Compute diagram of points split into a grid of tiles, returning it as a Diagram
+  which is the same as that of a serial run inside the bounding box.
+
+  The bounding rectangle of the sites is cut into tiles of equal size, about tiles
+  of them (by default one per tileSites sites, and at least one per worker). Each
+  tile is swept in a worker process along with a halo of the sites around it. The
+  halo is widened as far as the cells of the tile could reach, and the tile swept
+  again, as long as a cell of the tile is not proven exact. Tiles are merged like
+  slabs, every edge coming from the tile owning the lower of its two site ids,
+  clipped to the bounding box.
+  """
+  sites = voronoi.prepareSites(points)
+  n = len(sites)
+  workers = workers or os.cpu_count()
+  tiles = tiles or max(workers, -(-n // tileSites))
+
+  lo = sites.min(axis=0) if n else np.zeros(2)
+  extent = np.ptp(sites, axis=0) if n else np.zeros(2)
+  # sites all on one line across make a single row of tiles, or a single column
+  if extent[1] == 0:
+    columns = tiles if extent[0] > 0 else 1
+  else:
+    columns = min(max(int(round((tiles * extent[0] / extent[1]) ** 0.5)), 1), tiles)
+  rows = -(-tiles // columns)
+  if columns * rows < 2 or n < 4 * columns * rows:
+    voronoi.process(sites)
+    return voronoi.diagram()
+
+  # along a side with no extent every site is in the first tile, whatever its size
+  size = np.where(extent > 0, extent / (columns, rows), 1.0)
+  cell = np.minimum(((sites - lo) / size).astype(np.int64), (columns - 1, rows - 1))
+  owner = cell[:, 1] * columns + cell[:, 0]
+  order = np.argsort(owner, kind='stable')
+  offsets = np.zeros(columns * rows + 1, dtype=np.int64)
+  np.cumsum(np.bincount(owner, minlength=columns * rows), out=offsets[1:])
+
+  pieces = sweepHalos(voronoi, sites, owner, columns * rows, workers, tileHalo,
+                      lo, extent, size, columns, rows, order, offsets)
+  return mergeSlabs(voronoi, sites, owner, pieces)
+
+
+def tileHalo(sites, k, halo, lo, extent, size, columns, rows, order, offsets):
+  """
+  Return ids of the sites of tile k and of those within halo of it, with the bounds
+  they were given for. The grid of columns x rows tiles of the given size starts at
+  lo, order sorts sites by tile and offsets are where each tile starts in it.
+  """
+  i, j = k % columns, k // columns
+  bounds = [lo[0] + i * size[0] - halo, lo[1] + j * size[1] - halo,
+            lo[0] + (i + 1) * size[0] + halo, lo[1] + (j + 1) * size[1] + halo]
+
+  # sites of the tiles the halo reaches, one run of tiles per row
+  limit = (columns - 1, rows - 1)
+  first = np.clip(np.floor((np.array(bounds[:2]) - lo) / size), 0, limit).astype(np.int64)
+  last = np.clip(np.floor((np.array(bounds[2:]) - lo) / size), 0, limit).astype(np.int64)
+  ids = np.concatenate([order[offsets[r * columns + first[0]]:offsets[r * columns + last[0] + 1]]
+                        for r in range(first[1], last[1] + 1)])
+  inside = ((sites[ids] >= bounds[:2]) & (sites[ids] <= bounds[2:])).all(axis=1)
+  ids = np.sort(ids[inside])
+
+  # no site can be left out beyond the outermost sites
+  for side in range(2):
+    if bounds[side] <= lo[side]:
+      bounds[side] = -np.inf
+    if bounds[side + 2] >= lo[side] + extent[side]:
+      bounds[side + 2] = np.inf
+  return ids, tuple(bounds)
+
+
+def sweepHalos(voronoi, sites, owner, count, workers, gather, *layout):
+  """
+  Sweep each of count slabs or tiles holding a site in a worker process, along with
+  the sites gather(sites, k, halo, *layout) returns for piece k, as their ids and the
+  bounds they were given for. Halos start at four times the spacing of the sites. A
+  piece with a cell its halo did not prove exact is swept again, with the halo
+  widened as far as the cell could reach. Returns the pieces for mergeSlabs, None
+  for those without sites.
+  """
+  extent = np.ptp(sites, axis=0)
+  spacing = max((extent[0] * extent[1] / len(sites)) ** 0.5, extent.max() / len(sites))
+  halos = [4 * spacing] * count
+
+  pieces = [None] * count
+  executor = workerPool(workers)
+  pending = np.unique(owner).tolist()
+  while pending:
+    jobs = {}
+    for k in pending:
+      ids, bounds = gather(sites, k, halos[k], *layout)
+      jobs[k] = (ids, executor.submit(sweepTile, voronoi.width, voronoi.height, voronoi.engine,
+                                      sites[ids], owner[ids] == k, bounds))
+
+    pending = []
+    for k, (ids, job) in jobs.items():
+      vertices, edges, edge_sites, certified, reach = job.result()
+      pieces[k] = (ids, vertices, edges, edge_sites)
+      if not certified.all():
+        halos[k] = max(2 * halos[k], halos[k] + reach)
+        pending.append(k)
+  return pieces
+
+
+def mergeSlabs(voronoi, sites, owner, pieces):
+  """
+  Merge diagrams of the slabs or tiles into one Diagram. Empty tiles have no piece.
+
+  Each edge is taken from the piece owning the lower of its two site ids, but only
+  its part inside the bounding box, the only part its halo proves exact. Edges
+  missing the box are dropped, and ends cut off by the box are put on its lines,
+  where Diagram.clip takes them to be at infinity like the ends of rays.
+  """
+  width, height = voronoi.width, voronoi.height
+  size = np.array([width, height], dtype=float)
+  all_vertices = []
+  all_edges = []
+  all_sites = []
+  offset = 0
+  for k, piece in enumerate(pieces):
+    if piece is None:
+      continue
+    ids, vertices, edges, edge_sites = piece
+    edge_sites = ids[edge_sites]
+    keep = owner[edge_sites.min(axis=1)] == k
+    edges = edges[keep]
+
+    starts, ends, inside = clipSegments(vertices[edges[:, 0]], vertices[edges[:, 1]], width, height)
+    cut = np.stack([starts, ends], axis=1)
+    outside = ((vertices[edges] < 0) | (vertices[edges] > size)).any(axis=2)
+    inside &= (cut[:, 0] != cut[:, 1]).any(axis=1) | ~outside.any(axis=1)
+    edges, cut, outside = edges[inside], cut[inside], outside[inside]
+
+    # ends cut off become new vertices, snapped onto the nearest line of the box
+    cut = np.clip(cut[outside], 0, size)
+    side = np.argmin(np.minimum(cut, size - cut), axis=1)
+    rows = np.arange(len(cut))
+    cut[rows, side] = np.where(cut[rows, side] * 2 < size[side], 0, size[side])
+    edges[outside] = len(vertices) + rows
+
+    all_vertices.append(np.concatenate([vertices, cut]))
+    all_edges.append(edges + offset)
+    all_sites.append(edge_sites[keep][inside])
+    offset += len(vertices) + len(cut)
+
+  vertices = np.concatenate(all_vertices).reshape(-1, 2)
+  edges = np.concatenate(all_edges).reshape(-1, 2)
+  edge_sites = np.concatenate(all_sites).reshape(-1, 2)
+
+  # only keep vertices of edges kept, each once
+  used, inverse = np.unique(edges, return_inverse=True)
+  vertices, merged = np.unique(vertices[used], axis=0, return_inverse=True)
+  edges = merged.ravel()[inverse.ravel()].reshape(-1, 2)
+
+  offsets, indices = buildCells(sites, vertices, edges, edge_sites)
+  return Diagram(sites, vertices, edges, edge_sites, offsets, indices, voronoi.width, voronoi.height)
+
+
+def processChunk(engine, coords, offsets, boxes):
+  """
+  Compute diagrams of a chunk of point sets in a worker process. Point set i is
+  coords[offsets[i]:offsets[i + 1]] with bounding box boxes[i], and results come back
+  concatenated in the same way: sizes[i] holds the number of vertices, edges and cell
+  indices of diagram i.
+  """
+  from src.voronoi import Voronoi
+
+  parts = []
+  sizes = np.empty((len(boxes), 3), dtype=np.int64)
+  for i, (width, height) in enumerate(boxes.tolist()):
+    voronoi = Voronoi(width, height, engine=engine)
+    voronoi.process(coords[offsets[i]:offsets[i + 1]])
+    d = voronoi.diagram()
+    parts.append((d.vertices, d.edges, d.edgeSites, d.cellOffsets[1:], d.cellIndices))
+    sizes[i] = len(d.vertices), len(d.edges), len(d.cellIndices)
+
+  vertices, edges, edge_sites, cell_offsets, cell_indices = (
+    np.concatenate(column) if column else np.empty(0) for column in zip(*parts))
+  return sizes, vertices, edges, edge_sites, cell_offsets, cell_indices
+
+
+def unpackChunk(coords, offsets, boxes, result):
+  """Split the arrays computed by processChunk into one Diagram per point set."""
+  sizes, vertices, edges, edge_sites, cell_offsets, cell_indices = result
+  ends = np.cumsum(sizes, axis=0)
+  starts = ends - sizes
+
+  diagrams = []
+  for i, (width, height) in enumerate(boxes.tolist()):
+    (v0, e0, c0), (v1, e1, c1) = starts[i], ends[i]
+    n0, n1 = offsets[i], offsets[i + 1]
+    sites = coords[n0:n1]
+    diagrams.append(Diagram(sites, vertices[v0:v1].reshape(-1, 2), edges[e0:e1].reshape(-1, 2),
+                            edge_sites[e0:e1].reshape(-1, 2),
+                            np.concatenate([[0], cell_offsets[n0:n1]]).astype(np.int64),
+                            cell_indices[c0:c1].astype(np.int64), width, height))
+  return diagrams
+
+
+def packChunk(jobs, voronoi):
+  """Pack point sets of jobs into one coordinate array with offsets and boxes."""
+  coords = [voronoi.prepareSites(points) for points, _, _ in jobs]
+  offsets = np.zeros(len(jobs) + 1, dtype=np.int64)
+  np.cumsum([len(c) for c in coords], out=offsets[1:])
+  boxes = np.array([(width, height) for _, width, height in jobs], dtype=float).reshape(-1, 2)
+  return np.concatenate(coords).reshape(-1, 2), offsets, boxes
+
+
+def process_many(jobs, engine='fortune', workers=None, chunksize=64, ordered=True):
+  """
+  Compute diagrams of many independent point sets on the persistent worker pool.
+
+  Jobs is an iterable of (points, width, height). It is consumed lazily, in chunks
+  of chunksize jobs, and each chunk travels to and from a worker as a few flat
+  arrays rather than as pickled objects. With ordered, yields a Diagram per job in
+  the order of jobs, otherwise yields (index, Diagram) pairs as chunks complete.
+  """
+  from src.voronoi import Voronoi
+
+  voronoi = Voronoi(engine=engine)
+  executor = workerPool(workers)
+  jobs = iter(jobs)
+
+  # keep a couple of chunks queued per worker, so input is not read all at once
+  limit = 2 * poolSize
+  running = {}
+  done = {}
+  first = 0
+  next_first = 0
+  while True:
+    while len(running) < limit:
+      chunk = list(islice(jobs, chunksize))
+      if not chunk:
+        break
+      packed = packChunk(chunk, voronoi)
+      running[executor.submit(processChunk, engine, *packed)] = (next_first, packed)
+      next_first += len(chunk)
+
+    if not running:
+      break
+
+    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+    for future in finished:
+      start, packed = running.pop(future)
+      diagrams = unpackChunk(*packed, future.result())
+      if not ordered:
+        yield from enumerate(diagrams, start)
+      else:
+        done[start] = diagrams
+
+    while first in done:
+      diagrams = done.pop(first)
+      yield from diagrams
+      first += len(diagrams)
@@ -1,37 +1,163 @@
-from heapq import heappop, heappush
+import numpy as np
 
+from src.diagram import Diagram, buildCells
+from src.delaunay import Triangulation, infinite
+from src.external import chunkSites, openSites, sortedChunks
+from src.parallel import processSlabs, processTiles
 from src.voronoi_elements.point import Point
+from src.voronoi_elements.site import Site
 from src.voronoi_elements.edge import Edge
 from src.voronoi_elements.event import Event
+from src.voronoi_elements.event_queue import EventQueue
 from src.voronoi_elements.arc import Arc
+from src.voronoi_elements.vertex_table import VertexStream, VertexTable
+from src.voronoi_elements.predicates import arcOrder, orient2d, incircle, circumcenter, ccwErrBound
+
+engines = ('fortune', 'delaunay')
+
+
+def circumcenters(sites, triangles):
+  """
+  Return k x 2 array of the centers of the circles through triangles, k x 3 rows of
+  site ids, each taken from its lowest site like the vertices of processDelaunay.
+  """
+  ys, xs = sites[triangles, 1], sites[triangles, 0]
+  first = np.zeros(len(triangles), dtype=np.int64)
+  rows = np.arange(len(triangles))
+  for k in (1, 2):
+    lower = (ys[:, k] < ys[rows, first]) | ((ys[:, k] == ys[rows, first]) & (xs[:, k] < xs[rows, first]))
+    first = np.where(lower, k, first)
+
+  ids = [triangles[rows, (first + k) % 3] for k in range(3)]
+  a, b, c = (sites[i] for i in ids)
+  b, c = b - a, c - a
+  det_left, det_right = b[:, 0] * c[:, 1], b[:, 1] * c[:, 0]
+  d = 2 * (det_left - det_right)
+  b2 = (b ** 2).sum(axis=1)
+  c2 = (c ** 2).sum(axis=1)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    centers = np.column_stack([a[:, 0] + (c[:, 1] * b2 - b[:, 1] * c2) / d,
+                               a[:, 1] + (b[:, 0] * c2 - c[:, 0] * b2) / d])
+
+  # triangles turning by too little to trust are done exactly, one by one
+  uncertain = np.abs(det_left - det_right) <= ccwErrBound * (np.abs(det_left) + np.abs(det_right))
+  for t in np.nonzero(uncertain)[0]:
+    centers[t] = circumcenter(*(Point(sites[i[t]]) for i in ids))
+  return centers
 
 
 class Voronoi:
-  def __init__(self, width=800, height=400):
+  def __init__(self, width=800, height=400, presort=True, engine='fortune'):
+    """
+    With presort, site events are sorted once up front and merged with the
+    circle events, so only circle events go through the heap.
+
+    Engine 'fortune' computes the diagram with a sweep line, while 'delaunay' builds
+    the Delaunay triangulation and takes its dual. Both give the same edges and cells,
+    up to edges shorter than rounding error where sites are nearly cocircular.
+    """
+    if engine not in engines:
+      raise ValueError('engine must be one of %s, got %r' % (engines, engine))
+
     self.width = width
     self.height = height
+    self.presort = presort
+    self.engine = engine
 
   def process(self, points):
-    """Process given points, represented as tuple (x,y) to return edge collection."""
-    self.pq = []
+    """
+    Process given points, either a sequence of tuples (x,y) or an n x 2 array,
+    to return edge collection.
+    """
+    self.out = None
     self.edges = []
+    self.vertices = VertexTable()
     self.tree = None
     self.firstPoint = None  # handle tie breakers with first
     self.stillOnFirstRow = True
-    self.points = []
 
-    # Each point has unique identifier
-    for idx in range(len(points)):
-      pt = Point(points[idx], idx)
-      self.points.append(pt)
-      event = Event(pt, site=pt)
-      heappush(self.pq, event)
+    # Site coordinates stay in array storage. Each point has unique identifier,
+    # its row in self.sites, and its Site is only created once the sweep reaches it.
+    self.sites = self.prepareSites(points)
+    self.points = [None] * len(self.sites)
+    self.siteStorage = None
+    self.vertexOf = None
+    self.removedSites = set()
 
-    while self.pq:
-      event = heappop(self.pq)
-      if event.deleted:
-        continue
+    if self.engine == 'delaunay':
+      self.processDelaunay()
+      return
+
+    for _ in self.sweep():
+      pass
+
+  def stream(self, points):
+    """
+    Sweep given points like process, but yield the diagram as it is found instead of
+    keeping it: a record ('vertex', id, x, y) for each vertex once it is found, and
+    ('edge', left, right, start, end) for each edge, with the ids of its sites and
+    vertices, once both its ends are. Vertices come before the edges that end there,
+    and ends of rays at the bounding box come after the sweep.
+
+    Neither edges nor cells are kept, so memory held beyond the input stays in
+    proportion to the beach line whatever the size of the output, as long as the
+    consumer lets go of the records. The sweep is used with either engine.
+    """
+    self.out = []
+    self.edges = []
+    self.vertices = VertexStream(self.out)
+    self.tree = None
+    self.firstPoint = None
+    self.stillOnFirstRow = True
+    self.sites = self.prepareSites(points)
+    self.points = None
+    self.siteStorage = None
+    self.vertexOf = None
+    self.removedSites = set()
+    yield from self.sweep()
+
+  def streamFile(self, path, chunksize=chunkSites, directory=None):
+    """
+    Stream the diagram of the sites in path like stream, where path is a .npy file
+    or raw float64 (x,y) pairs. Sites are left on disk, sorted into sweep order by an
+    external merge sort with temporary runs in directory, and read back in chunks of
+    chunksize sites as the sweep reaches them. Site ids are rows of the file.
+    """
+    sites = openSites(path)
+    self.out = []
+    self.edges = []
+    self.vertices = VertexStream(self.out)
+    self.tree = None
+    self.firstPoint = None
+    self.stillOnFirstRow = True
+    self.sites = sites
+    self.points = None
+    self.siteStorage = None
+    self.vertexOf = None
+    self.removedSites = set()
+    yield from self.sweep(sortedChunks(sites, chunksize, directory))
+
+  def sweep(self, chunks=None):
+    """
+    Run the sweep over self.sites, or over chunks of them already in sweep order.
+    When streaming, yields the records found after every event.
+    """
+    if chunks is not None:
+      self.pq = EventQueue(chunks=chunks)
+    elif self.presort:
+      # sweep order is descending y, then ascending x. lexsort is stable, so
+      # exact ties stay in input order just as with the heap.
+      order = np.lexsort((self.sites[:, 0], -self.sites[:, 1]))
+      self.pq = EventQueue(self.sites[order], order)
+    else:
+      self.pq = EventQueue()
+      for idx in range(len(self.sites)):
+        pt = Site(self.sites[idx].tolist(), idx)
+        self.pq.push(Event(pt, site=pt))
 
+    self.lastSite = None
+    while self.pq:
+      event = self.pq.pop()
       self.sweepPt = event.p
 
       # Special case if multiple points are all on first row.
@@ -44,17 +170,466 @@ class Voronoi:
       else:
         self.processCircle(event)
 
-        # complete edges that remain and stretch to infinity
+      if self.out:
+        yield from self.out
+        self.out.clear()
+
+    # complete edges that remain and stretch to infinity
     if self.tree and not self.tree.isLeaf:
       self.finishEdges(self.tree)
+    if self.out:
+      yield from self.out
+      self.out.clear()
 
-      # Complete Voronoi Edges with partners.
-      for e in self.edges:
-        if e.partner:
-          if e.b is None:
-            e.start.y = self.height
-          else:
-            e.start = e.partner.end
+  def processParallel(self, points, workers=None, slabs=None):
+    """
+    Process given points split into vertical slabs, which are swept in parallel by a
+    pool of worker processes and merged. Returns the same Diagram as a serial run,
+    but leaves no edge collection behind.
+    """
+    return processSlabs(self, points, workers, slabs)
+
+  def processTiled(self, points, workers=None, tiles=None):
+    """
+    Process given points split into a grid of about tiles tiles, each swept with a
+    halo of the sites around it by a pool of worker processes, and stitched together.
+    Returns the same Diagram as a serial run, but leaves no edge collection behind.
+    """
+    return processTiles(self, points, workers, tiles)
+
+  def processCached(self, points, cache):
+    """
+    Return the Diagram of given points from cache, a DiagramCache, processing them
+    and adding the result only when it has none. On a hit nothing is processed, so
+    the state of a previous call is left as it was.
+    """
+    sites = self.prepareSites(points)
+    key = cache.key(sites, self.width, self.height, self.engine)
+    diagram = cache.get(key)
+    if diagram is None:
+      self.process(sites)
+      diagram = self.diagram()
+      cache.put(key, diagram)
+    return diagram
+
+  def diagram(self):
+    """Return result of the last call to process as columnar arrays."""
+    vertices = self.vertices.asArray()
+    edges = [e for e in self.edges if None not in e.vertexIds()]
+    edge_ids = np.array([e.vertexIds() for e in edges], dtype=np.int64).reshape(-1, 2)
+    edge_sites = np.array([(e.left.idx, e.right.idx) for e in edges], dtype=np.int64).reshape(-1, 2)
+
+    if self.vertices.free:
+      # drop vertices removed by updates, renumbering the others
+      keep = np.ones(len(vertices), dtype=bool)
+      keep[self.vertices.free] = False
+      vertices = vertices[keep]
+      edge_ids = (np.cumsum(keep) - 1)[edge_ids]
+
+    # sites may still be moved by later updates
+    sites = self.sites.copy()
+    offsets, indices = buildCells(sites, vertices, edge_ids, edge_sites)
+    return Diagram(sites, vertices, edge_ids, edge_sites, offsets, indices, self.width, self.height)
+
+  def processDelaunay(self):
+    """
+    Compute diagram as the dual of the Delaunay triangulation of the sites. Every
+    triangle gives a Voronoi vertex at its circumcenter, and every Delaunay edge a
+    Voronoi edge between the vertices of the triangles on either side, or a ray
+    out of the hull for an edge of the hull.
+    """
+    self.triangulation = Triangulation(self.sites, removed=self.removedSites)
+    self.points = [Site(p, idx) for idx, p in enumerate(self.sites.tolist())]
+    tri = self.triangulation
+
+    # Vertex of each finite triangle, and number of triangles sharing each vertex.
+    # Every Delaunay edge (a, b) is seen from the triangle t on its left. The dual edge
+    # runs from the triangle on its right to t, with the cell of a on its left, and
+    # halves[a, b] is the half edge of cell a, which ends at the vertex of t. Edges
+    # are found in self.edges at the position recorded for their pair of sites.
+    self.vertexOf = {}
+    self.vertexUses = {}
+    self.halves = {}
+    self.edgeOf = {}
+
+    self.assignVertices(tri)
+    if not self.vertexOf:
+      self.collinearEdges()
+      return
+
+    for t in tri:
+      for i in range(3):
+        self.dualEdge(t, i)
+    for t in tri:
+      self.linkCorners(t)
+
+  def assignVertices(self, triangles):
+    """
+    Give each of the finite triangles that has none the vertex at its circumcenter.
+    Triangles sharing a circumcircle share a vertex, so the zero length edge between
+    them is left out. Returns triangles given a vertex, including any neighbours
+    moved to a shared one.
+    """
+    tri = self.triangulation
+    changed = []
+    for t in triangles:
+      if t in self.vertexOf or tri.isGhost(t):
+        continue
+
+      group = [t]
+      seen = {t}
+      for u in group:
+        for w in tri.adjacent[3 * u:3 * u + 3]:
+          if w not in seen and not tri.isGhost(w) and self.cocircular(u, w):
+            seen.add(w)
+            group.append(w)
+
+      existing = [self.vertexOf[u] for u in group if u in self.vertexOf]
+      if existing:
+        v = existing[0]
+      else:
+        # start from the lowest point, so the vertex does not depend on insertion order
+        a, b, c = (self.points[u] for u in tri.vertices(t))
+        while (b.y, b.x) < (a.y, a.x) or (c.y, c.x) < (a.y, a.x):
+          a, b, c = b, c, a
+        v = self.vertices.add(Point(circumcenter(a, b, c)), None, 0)
+        self.vertexUses[v] = 0
+
+      for u in group:
+        if self.vertexOf.get(u) != v:
+          if u in self.vertexOf:
+            self.releaseVertex(u)
+          self.vertexOf[u] = v
+          self.vertexUses[v] += 1
+          changed.append(u)
+    return changed
+
+  def releaseVertex(self, t):
+    """Drop vertex of triangle t, removing it once no triangle shares it."""
+    v = self.vertexOf.pop(t)
+    self.vertexUses[v] -= 1
+    if self.vertexUses[v] == 0:
+      del self.vertexUses[v]
+      self.vertices.remove(v)
+
+  def dualEdge(self, t, i):
+    """Add Voronoi edge dual to the edge of finite triangle t opposite its vertex i."""
+    tri = self.triangulation
+    a, b = tri.triangles[3 * t + (i + 1) % 3], tri.triangles[3 * t + (i + 2) % 3]
+    u = tri.adjacent[3 * t + i]
+    if (a, b) in self.halves:
+      return
+
+    v = self.vertexOf[t]
+    if not tri.isGhost(u) and self.vertexOf[u] == v:
+      return
+
+    if tri.isGhost(u):
+      # ray leaving the hull, traced outwards from the vertex of t
+      edge = Edge(self.vertices.point(v), self.points[a], self.points[b])
+      edge.rightHalf.origin = v
+      edge.finish(self.width, self.height, self.vertices)
+      self.vertices.halfEdges[v] = edge.rightHalf
+      self.halves[a, b] = edge.leftHalf
+      self.halves[b, a] = edge.rightHalf
+    else:
+      w = self.vertexOf[u]
+      edge = Edge(self.vertices.point(w), self.points[b], self.points[a])
+      edge.rightHalf.origin = w
+      edge.setEnd(v)
+      self.vertices.halfEdges[w] = edge.rightHalf
+      self.vertices.halfEdges[v] = edge.leftHalf
+      self.vertices.degrees[w] += 1
+      self.halves[a, b] = edge.rightHalf
+      self.halves[b, a] = edge.leftHalf
+
+    self.vertices.degrees[v] += 1
+    self.edgeOf[min(a, b), max(a, b)] = len(self.edges)
+    self.edges.append(edge)
+
+  def removeDualEdge(self, a, b):
+    """Remove Voronoi edge between the cells of sites a and b, if there is one."""
+    pos = self.edgeOf.pop((min(a, b), max(a, b)), None)
+    if pos is None:
+      return
+
+    edge = self.edges[pos]
+    last = self.edges.pop()
+    if last is not edge:
+      self.edges[pos] = last
+      self.edgeOf[min(last.left.idx, last.right.idx), max(last.left.idx, last.right.idx)] = pos
+
+    for h in (self.halves.pop((a, b)), self.halves.pop((b, a))):
+      if h.face.halfEdge is h:
+        h.face.halfEdge = None
+      if h.origin in self.vertexUses:
+        self.vertices.degrees[h.origin] -= 1
+      else:
+        # end of a ray on the bounding box
+        self.vertices.remove(h.origin)
+
+  def linkCorners(self, t):
+    """
+    Around vertex of finite triangle (a, b, c), the half edge of cell a dual to (a, b)
+    is followed by the one dual to (a, c), skipping zero length edges.
+    """
+    tri = self.triangulation
+    for i in range(3):
+      a, b, c = (tri.triangles[3 * t + (i + k) % 3] for k in range(3))
+      u = t
+      while (a, c) not in self.halves:
+        # step across (a, c) to the next triangle around a
+        j = tri.vertices(u).index(a)
+        u = tri.adjacent[3 * u + (j + 1) % 3]
+        c = tri.triangles[3 * u + (tri.vertices(u).index(a) + 2) % 3]
+      if (a, b) in self.halves:
+        self.halves[a, b].setNext(self.halves[a, c])
+
+  def updateDual(self, created, removed):
+    """
+    Bring the diagram up to date after triangles removed from the triangulation, given
+    as their vertices by id, were replaced by triangles created. Only the edges of those
+    triangles, and of the triangles next to them, are rebuilt. Returns ids of the sites
+    whose cell changed.
+    """
+    tri = self.triangulation
+    pairs = set()
+    for tri_vertices in list(removed.values()) + [tri.vertices(t) for t in created]:
+      for i in range(3):
+        a, b = tri_vertices[i], tri_vertices[(i + 1) % 3]
+        if infinite not in (a, b):
+          pairs.add((min(a, b), max(a, b)))
+
+    for a, b in pairs:
+      self.removeDualEdge(a, b)
+    for t in removed:
+      if t in self.vertexOf:
+        self.releaseVertex(t)
+
+    changed = self.assignVertices(created)
+    for t in changed:
+      tri_vertices = tri.vertices(t)
+      for i in range(3):
+        a, b = tri_vertices[i], tri_vertices[(i + 1) % 3]
+        if (min(a, b), max(a, b)) not in pairs:
+          self.removeDualEdge(a, b)
+          pairs.add((min(a, b), max(a, b)))
+
+    # rebuild edges still in the triangulation from finite triangles around them,
+    # along with the triangles sharing their vertex, whose links skip over them
+    around = set(created) | set(changed)
+    around |= {u for t in around for u in tri.adjacent[3 * t:3 * t + 3]}
+    around = [t for t in around if not tri.isGhost(t)]
+    seen = set(around)
+    for t in around:
+      for u in tri.adjacent[3 * t:3 * t + 3]:
+        if u not in seen and self.vertexOf.get(u) == self.vertexOf[t]:
+          seen.add(u)
+          around.append(u)
+    for t in around:
+      tri_vertices = tri.vertices(t)
+      for i in range(3):
+        a, b = tri_vertices[(i + 1) % 3], tri_vertices[(i + 2) % 3]
+        if (min(a, b), max(a, b)) in pairs:
+          self.dualEdge(t, i)
+    for t in around:
+      self.linkCorners(t)
+
+    sites = {v for a, b in pairs for v in (a, b)}
+    for v in sites:
+      polygon = self.points[v].polygon
+      if polygon.halfEdge is None:
+        polygon.halfEdge = next((self.halves[v, u] for u in sites if (v, u) in self.halves), None)
+    return {v for t in created for v in tri.vertices(t) if v != infinite}
+
+  def cocircular(self, t, u):
+    """True if the vertex of u opposite the edge shared with t is on the circumcircle of t."""
+    a, b, c = (self.points[v] for v in self.triangulation.vertices(t))
+    d = next(v for v in self.triangulation.vertices(u) if v not in self.triangulation.vertices(t))
+    return incircle(a, b, c, self.points[d]) == 0
+
+  def collinearEdges(self):
+    """
+    With all sites on one line, the diagram is a set of parallel lines, one between
+    each pair of sites next to each other in sweep order.
+    """
+    order = np.lexsort((self.sites[:, 0], -self.sites[:, 1]))
+    # of duplicate sites only the first, with the lowest id, has a cell
+    kept = []
+    for i in order.tolist():
+      if i not in self.removedSites and (not kept or self.points[i] != self.points[kept[-1]]):
+        kept.append(i)
+
+    for i, j in zip(kept, kept[1:]):
+      left, right = self.points[i], self.points[j]
+      start = Point(((left.x + right.x) / 2, (left.y + right.y) / 2))
+      neg_ray = Edge(start, left, right)
+      pos_ray = Edge(start, right, left, opposite=neg_ray)
+      neg_ray.finish(self.width, self.height, self.vertices)
+      pos_ray.finish(self.width, self.height, self.vertices)
+      self.edges.append(neg_ray)
+
+  def insert(self, point):
+    """
+    Add site at point (x,y) to the diagram computed by the last call to process, and
+    return the set of ids of the cells that changed, the new one included. The new
+    site gets the next id.
+
+    Only the cells the new site takes area from are rebuilt, from the Delaunay
+    triangulation, so the first insert into a diagram from the sweep converts it
+    once. Until the sites span more than a line, the diagram is computed again.
+    """
+    p = self.prepareSites([point])[0]
+    self.prepareUpdate()
+
+    v = self.appendSite(p)
+    if not self.vertexOf:
+      return self.rebuild()
+
+    self.triangulation.addPoint(p.tolist())
+    self.points.append(Site(p.tolist(), v))
+    created, removed = self.triangulation.insert(v, near=True)
+    return self.updateDual(created, removed)
+
+  def remove(self, site_id):
+    """
+    Remove site site_id from the diagram computed by the last call to process, and
+    return the set of ids of the cells that changed, its own included. Ids of the
+    other sites stay the same, and the removed one keeps an empty cell.
+
+    The cells around the removed one are repaired from the Delaunay triangulation,
+    as for insert.
+    """
+    self.prepareUpdate()
+    self.checkSite(site_id)
+
+    self.removedSites.add(site_id)
+    update = self.triangulation.remove(site_id) if self.vertexOf else None
+    if update is None:
+      return self.rebuild()
+    return self.updateDual(*update) | {site_id}
+
+  def move(self, site_id, point):
+    """
+    Move site site_id to point (x,y), and return the set of ids of the cells that
+    changed. The site is removed and inserted again, repairing the cells around
+    its old and new position.
+    """
+    p = self.prepareSites([point])[0]
+    self.prepareUpdate()
+    self.checkSite(site_id)
+
+    update = self.triangulation.remove(site_id) if self.vertexOf else None
+    self.sites[site_id] = p
+    if update is None:
+      return self.rebuild()
+
+    changed = self.updateDual(*update) | {site_id}
+    self.triangulation.points[site_id] = Point(p.tolist())
+    self.points[site_id] = Site(p.tolist(), site_id)
+    created, removed = self.triangulation.insert(site_id, near=True)
+    return changed | self.updateDual(created, removed)
+
+  def processFrame(self, points, maxFlips=None):
+    """
+    Move the sites of the diagram computed by the last call to process to points,
+    one row per site, as the next frame of an animation. Returns the number of
+    Delaunay edges flipped to bring the diagram up to date, or None if the motion was
+    too large and the diagram was computed again.
+
+    Sites moving a little leave the Delaunay triangulation valid, with only some of
+    its edges no longer Delaunay. Those are flipped, and the few sites whose
+    triangles would turn over are removed and inserted again. Only the Voronoi edges
+    around those changes and on the hull are rebuilt, while all other vertices move
+    to their new circumcenters at once. Once more than maxFlips flips and sites
+    inserted again are needed (by default half the number of sites), the diagram is
+    computed from scratch instead.
+    """
+    sites = self.prepareSites(points)
+    if sites.shape != self.sites.shape:
+      raise ValueError('points must give one row for each of the %d sites, got %d' %
+                       (len(self.sites), len(sites)))
+    self.prepareUpdate()
+
+    tri = self.triangulation
+    limit = len(sites) // 2 if maxFlips is None else maxFlips
+    update = tri.move(sites, limit) if self.vertexOf else None
+    self.sites[:] = sites
+    if update is None:
+      self.rebuild()
+      return None
+
+    changed, flips = update
+    for site, (x, y) in zip(self.points, sites.tolist()):
+      site.x, site.y = x, y
+      site.polygon.pt = (x, y)
+
+    # Voronoi edges still in place only need their vertices moved. Line parameters of
+    # these edges are left as they were, as nothing reads them after the sweep.
+    triangles = np.array(tri.triangles, dtype=np.int64).reshape(-1, 3)
+    ids = np.fromiter(self.vertexOf, dtype=np.int64, count=len(self.vertexOf))
+    vertex = np.full(len(triangles), -1, dtype=np.int64)
+    vertex[ids] = np.fromiter(self.vertexOf.values(), dtype=np.int64, count=len(ids))
+    moved = ids[~np.isin(ids, list(changed))]
+    self.vertices.move(vertex[moved], circumcenters(sites, triangles[moved]))
+
+    # Edges are rebuilt around triangles changed, triangles on the hull, whose rays
+    # depend on the sites, and pairs of triangles which came onto or left one circle.
+    t, _, u, sign = tri.edgeSigns(sites)
+    stale = np.isin(t, list(changed)) | np.isin(u, list(changed))
+    regroup = ~stale & ((vertex[t] == vertex[u]) != (sign == 0))
+    live = np.ones(len(triangles), dtype=bool)
+    live[tri.free] = False
+    finite = live & (triangles != infinite).all(axis=1)
+    g, k = np.nonzero(live[:, None] & (triangles == infinite))
+    hull = np.array(tri.adjacent, dtype=np.int64).reshape(-1, 3)[g, k]
+    created = {t for t in changed if finite[t]}
+    created |= set(t[regroup].tolist()) | set(u[regroup].tolist()) | set(hull[finite[hull]].tolist())
+
+    removed = {t: tuple(tri.vertices(t)) for t in created}
+    removed.update(changed)
+    self.updateDual(list(created), removed)
+    return flips
+
+  def prepareUpdate(self):
+    """Build the Delaunay triangulation updates work on, unless it exists already."""
+    if self.vertexOf is None:
+      self.edges = []
+      self.vertices = VertexTable()
+      self.processDelaunay()
+
+  def checkSite(self, site_id):
+    if not 0 <= site_id < len(self.sites) or site_id in self.removedSites:
+      raise ValueError('no site with id %r' % (site_id,))
+
+  def rebuild(self):
+    """Compute the diagram again from all sites, which are all returned as changed."""
+    self.edges = []
+    self.vertices = VertexTable()
+    self.processDelaunay()
+    return set(range(len(self.sites)))
+
+  def appendSite(self, p):
+    """Append p to self.sites, growing its storage geometrically. Returns its id."""
+    n = len(self.sites)
+    if self.siteStorage is None or len(self.siteStorage) == n:
+      self.siteStorage = np.empty((max(2 * n, 16), 2))
+      self.siteStorage[:n] = self.sites
+    self.siteStorage[n] = p
+    self.sites = self.siteStorage[:n + 1]
+    return n
+
+  def prepareSites(self, points):
+    """Validate points, returning them as an n x 2 array."""
+    sites = np.array(points, dtype=float)
+    if sites.size == 0:
+      return sites.reshape(0, 2)
+    if sites.ndim != 2 or sites.shape[1] != 2:
+      raise ValueError('points must be given as (x,y) pairs, got shape %s' % (sites.shape,))
+    if not np.isfinite(sites).all():
+      raise ValueError('points must have finite coordinates')
+
+    return sites
 
   def findArc(self, x):
     """
@@ -63,16 +638,35 @@ class Voronoi:
     """
     n = self.tree
     while not n.isLeaf:
-      line_x = self.computeBreakPoint(n)  # compute breakpoint based on sweep line
-
       # if tie, can choose either one.
-      if line_x > x:
+      if self.leftOfBreakPoint(n, x):
         n = n.left
       else:
         n = n.right
 
     return n
 
+  def leftOfBreakPoint(self, n, x):
+    """
+    Return whether x lies left of the breakpoint of interior node n on the sweep line.
+    Sites above the sweep line are told apart exactly by which parabola is nearer the
+    sweep line at x, as a site close to a breakpoint can be put in the wrong arc by a
+    computed one. Of the two places where the parabolas cross, the breakpoint is the
+    one past the apex of the narrower parabola, whichever side that is on.
+    """
+    a = n.getLargestLeftDescendant().site
+    b = n.getSmallestRightDescendant().site
+    y = self.sweepPt.y
+    if a == b or a.y == y or b.y == y:
+      return self.computeBreakPoint(n) > x
+
+    nearer = arcOrder(a, b, Point((x, y))) > 0
+    if a.y < b.y:
+      return nearer or x < a.x
+    if a.y > b.y:
+      return nearer and x < b.x
+    return nearer
+
   def computeBreakPoint(self, n):
     """
     With sweep line Y coordinate and left/right children of interior node. You want
@@ -131,8 +725,9 @@ class Voronoi:
       x = -c / b
       return x
 
-    # two solutions, possibly
-    sq = b * b - 4 * a * c
+    # two solutions, possibly. Discriminant can only be negative through rounding
+    # errors when the parabolas touch, so clamp it rather than take a complex root.
+    sq = max(b * b - 4 * a * c, 0)
 
     x1 = (-b - (sq ** 0.5)) / (2 * a)
     x2 = (-b + (sq ** 0.5)) / (2 * a)
@@ -144,6 +739,17 @@ class Voronoi:
 
   def processSite(self, event):
     """Process a site event from the queue."""
+    if self.out is None:
+      self.points[event.p.idx] = event.p
+
+    self.sweepCircle = None
+
+    # Sites at the same place come one after the other, lowest id first. Only that
+    # one gets a cell, as with the delaunay engine.
+    last, self.lastSite = self.lastSite, event.p
+    if last is not None and last.x == event.p.x and last.y == event.p.y:
+      self.lastSite = last
+      return
 
     if self.tree is None:
       self.tree = Arc(event.p)
@@ -159,12 +765,15 @@ class Voronoi:
 
       start = Point(((self.firstPoint.x + event.p.x) / 2, self.height))
       edge = Edge(start, self.firstPoint, event.p)
+      edge.rightHalf.origin = self.vertices.add(start, edge.rightHalf, 1)
 
       self.tree = Arc(edge=edge)
       self.tree.setLeft(left)
       self.tree.setRight(right)
+      self.tree.updateHeight()
+      left.setNext(right, self.tree)
 
-      self.edges.append(edge)
+      self.addEdge(edge)
       return
 
     # find point on parabola where event.pt.x bisects with vertical line,
@@ -173,56 +782,128 @@ class Voronoi:
     # Special case where there are multiple points, all horizontal with first point
     # so keep expanding to the right
     if self.stillOnFirstRow:
-      leaf.setLeft(Arc(leaf.site))
+      left_arc = Arc(leaf.site)
+      right_arc = Arc(event.p)
+      leaf.replaceInBeachline(left_arc, right_arc)
+      left_arc.setNext(right_arc, leaf)
+
+      leaf.setLeft(left_arc)
       start = Point(((leaf.site.x + event.p.x) / 2, self.height))
 
       leaf.edge = Edge(start, leaf.site, event.p)
+      leaf.edge.rightHalf.origin = self.vertices.add(start, leaf.edge.rightHalf, 1)
       leaf.isLeaf = False
-      leaf.setRight(Arc(event.p))
+      leaf.setRight(right_arc)
+      self.rebalance(leaf)
 
-      self.edges.append(leaf.edge)
+      self.addEdge(leaf.edge)
       return
 
     # If leaf had a circle event, it is no longer valid
     # since it is being split
     if leaf.circleEvent:
-      leaf.circleEvent.deleted = True
+      self.pq.cancel(leaf.circleEvent)
 
     # Voronoi edges discovered between two sites. Leaf.site is higher
     # giving orientation to these edges.
     start = leaf.pointOnBisectionLine(event.p.x, self.sweepPt.y)
     neg_ray = Edge(start, leaf.site, event.p)
-    pos_ray = Edge(start, event.p, leaf.site)
+    pos_ray = Edge(start, event.p, leaf.site, opposite=neg_ray)
     neg_ray.partner = pos_ray
-    self.edges.append(neg_ray)
+    pos_ray.partner = neg_ray
+    self.addEdge(neg_ray)
 
     # old leaf becomes root of two nodes, and grandparent of two
     leaf.edge = pos_ray
     leaf.isLeaf = False
 
+    left_arc = Arc(leaf.site)
+    middle_arc = Arc(event.p)
+    right_arc = Arc(leaf.site)
+
     left = Arc()
     left.edge = neg_ray
-    left.setLeft(Arc(leaf.site))
-    left.setRight(Arc(event.p))
+    left.setLeft(left_arc)
+    left.setRight(middle_arc)
+    left.updateHeight()
+
+    leaf.replaceInBeachline(left_arc, right_arc)
+    left_arc.setNext(middle_arc, left)
+    middle_arc.setNext(right_arc, leaf)
 
     leaf.setLeft(left)
-    leaf.setRight(Arc(leaf.site))
+    leaf.setRight(right_arc)
+    self.rebalance(leaf)
+
+    self.generateCircleEvent(left_arc)
+    self.generateCircleEvent(right_arc)
 
-    self.generateCircleEvent(left.left)
-    self.generateCircleEvent(leaf.right)
+  def addEdge(self, edge):
+    if self.out is None:
+      self.edges.append(edge)
+
+  def edgeEnded(self, edge):
+    """When streaming, hand edge on once both its ends are known, and let go of it."""
+    if self.out is None or None in edge.vertexIds():
+      return
+
+    self.out.append(('edge', edge.left.idx, edge.right.idx) + edge.vertexIds())
+    for h in (edge.leftHalf, edge.rightHalf):
+      if h.face.halfEdge is h:
+        h.face.halfEdge = None
+
+  def rebalance(self, n):
+    """Restore balance of the beach line from interior node n up to the root."""
+    while n is not None:
+      n = n.rebalance()
+      if n.parent is None:
+        self.tree = n
+      n = n.parent
 
   def finishEdges(self, n):
     """
-    Close all Voronoi edges against maximum bounding box, based on how edge extends.
+    Close all Voronoi edges left in the beach line below n against maximum bounding
+    box, based on how edge extends.
+    """
+    stack = [n]
+    while stack:
+      n = stack.pop()
+      n.edge.finish(self.width, self.height, self.vertices)
+      self.edgeEnded(n.edge)
+      stack.extend(child for child in (n.right, n.left) if not child.isLeaf)
+
+  def cocircularVertex(self, left, right, circle):
+    """
+    Return the vertex already found at the center of circle, through the sites of
+    arcs left, its next and right, or None. As the arcs of all sites on the circle
+    shrink to its center one after another, such a vertex starts an edge between two
+    of them next to left or right on the beach line.
     """
-    n.edge.finish(self.width, self.height)
-    n.edge.left.polygon.addToFront(n.edge.end)
-    n.edge.right.polygon.addToEnd(n.edge.end)
+    for near, leftwards in ((left, True), (right, False)):
+      while True:
+        far = near.prev if leftwards else near.next
+        if far is None or far.site not in circle and incircle(*circle, far.site) != 0:
+          break
+        edge = (near.leftBreak if leftwards else near.rightBreak).edge
+        third = next(site for site in circle if site is not near.site and site is not far.site)
+        if edge.startsOnCircle(third):
+          return edge.rightHalf.origin
+        near = far
+    return None
+
+  def throughSweepPoint(self, sites):
+    """
+    Return whether the circle through sites passes through the sweep point: the site
+    just added, or the bottom of the circle of the vertex just found.
+    """
+    if self.sweepCircle is None:
+      return any(site is self.sweepPt for site in sites)
+    return all(site in self.sweepCircle or incircle(*self.sweepCircle, site) == 0 for site in sites)
 
-    if not n.left.isLeaf:
-      self.finishEdges(n.left)
-    if not n.right.isLeaf:
-      self.finishEdges(n.right)
+  def replaceHalfEdge(self, h, other):
+    """Let the face of half edge h, which is dropped, hold other instead."""
+    if h.face.halfEdge is h:
+      h.face.halfEdge = other
 
   def generateCircleEvent(self, node):
     """
@@ -231,89 +912,130 @@ class Voronoi:
     event to the priority queue for further processing.
     """
     # Find neighbor on the left and right, should they exist.
-    left_a = node.getLeftAncestor()
+    left_a = node.leftBreak
     if left_a is None:
       return
-    left = left_a.getLargestLeftDescendant()
+    left = node.prev
 
-    right_a = node.getRightAncestor()
+    right_a = node.rightBreak
     if right_a is None:
       return
-    right = right_a.getSmallestRightDescendant()
+    right = node.next
 
     # sanity check. Must be different
     if left.site == right.site:
       return
 
-    # If two edges have no intersection, leave now
-    p = left_a.edge.intersect(right_a.edge)
-    if p is None:
+    # Breakpoints only converge when the three sites turn clockwise.
+    if orient2d(left.site, node.site, right.site) >= 0:
       return
 
+    p = Point(circumcenter(left.site, node.site, right.site))
     radius = ((p.x - left.site.x) ** 2 + (p.y - left.site.y) ** 2) ** 0.5
 
-    # make sure choose point at bottom of circumcircle
+    # make sure choose point at bottom of circumcircle. With four or more sites on
+    # one circle it can fall level with the sweep, and is only stale if the queue
+    # would have taken it before the current event.
     circle_event = Event(Point((p.x, p.y - radius)))
-    if circle_event.p.y >= self.sweepPt.y:
-      return
+    if (circle_event.p.y, -circle_event.p.x) > (self.sweepPt.y, -self.sweepPt.x):
+      # A circle through the sweep point cannot have its bottom above it, but may
+      # have it right there, however rounding puts it.
+      if not self.throughSweepPoint((left.site, node.site, right.site)):
+        return
+      circle_event = Event(Point((self.sweepPt.x, self.sweepPt.y)))
 
     node.circleEvent = circle_event
     circle_event.node = node
-    heappush(self.pq, circle_event)
+    self.pq.push(circle_event)
 
   def processCircle(self, event):
     """Process circle event."""
     node = event.node
 
     # Find neighbor on the left and right.
-    left_a = node.getLeftAncestor()
-    left = left_a.getLargestLeftDescendant()
-    right_a = node.getRightAncestor()
-    right = right_a.getSmallestRightDescendant()
+    left_a = node.leftBreak
+    left = node.prev
+    right_a = node.rightBreak
+    right = node.next
 
     # Eliminate old circle events if they exist.
     if left.circleEvent:
-      left.circleEvent.deleted = True
+      self.pq.cancel(left.circleEvent)
     if right.circleEvent:
-      right.circleEvent.deleted = True
+      self.pq.cancel(right.circleEvent)
 
     # Circle defined by left - node - right. Terminate Voronoi rays
     p = node.pointOnBisectionLine(event.p.x, self.sweepPt.y)
 
-    # this is a real Voronoi point! Add to appropriate polygons
-    if left.site.polygon.last == node.site.polygon.first:
-      node.site.polygon.addToEnd(p)
+    # this is a real Voronoi point! Three edges meet here.
+    left_edge = left_a.edge
+    right_edge = right_a.edge
+
+    # With four or more sites on one circle, all their arcs shrink to its center one
+    # after another, and should meet at a single vertex. An edge closed here may
+    # have started from there and so has no length, in which case it is dropped.
+    circle = (left.site, node.site, right.site)
+    self.sweepCircle = circle
+    left_merged = left_edge.startsOnCircle(right.site)
+    right_merged = right_edge.startsOnCircle(left.site)
+    if left_merged:
+      v = left_edge.rightHalf.origin
+    elif right_merged:
+      v = right_edge.rightHalf.origin
     else:
-      node.site.polygon.addToFront(p)
-
-    left.site.polygon.addToFront(p)
-    right.site.polygon.addToEnd(p)
-
-    # Found Voronoi vertex. Update edges appropriately
-    left_a.edge.end = p
-    right_a.edge.end = p
+      v = self.cocircularVertex(left, right, circle)
+    found = v is not None
+    if not found:
+      v = self.vertices.add(p, left_edge.leftHalf, 3)
+
+    # Found Voronoi vertex. Update edges appropriately. A ray traced the other way
+    # from the same start now has a vertex at its far end.
+    for edge, merged in ((left_edge, left_merged), (right_edge, right_merged)):
+      if not merged:
+        edge.setEnd(v)
+        self.edgeEnded(edge)
+        if edge.partner is not None:
+          edge.partner.circle = circle
 
     # Find where to record new voronoi edge. Place with
     # (left) or (right), depending on which of left_a/right_a is higher
-    # in the beach-line tree. Without loss of generality, assume left_a is higher.
-    # Reason is because node is being deleted and the highest ancestor (left_a) is
-    # interior node that represents breakpoint involving node, and this interior
-    # node must now represent the breakpoint [left|right]. Since left_a is higher,
-    # it will remain while right_a is being removed (effectively replaced by right).
-    t = node
-    ancestor = None
-    while t != self.tree:
-      t = t.parent
-      if t == left_a:
-        ancestor = left_a
-      elif t == right_a:
-        ancestor = right_a
-
+    # in the beach-line tree. One of them is the parent of node and is removed
+    # along with it, the other is a higher ancestor that must now represent
+    # the breakpoint [left|right].
+    ancestor = node.survivingBreak()
     ancestor.edge = Edge(p, left.site, right.site)
-    self.edges.append(ancestor.edge)
+    ancestor.edge.circle = circle
+    self.addEdge(ancestor.edge)
+
+    # Link half edges around the vertex, counter clockwise within each of the three
+    # cells: node's cell is closed off at p, while the new edge starts from p. The
+    # half edges of a dropped edge are passed over to the ones on from them.
+    ancestor.edge.rightHalf.origin = v
+    node_in = None
+    if self.out is None:
+      node_in = left_edge.rightHalf.prev if left_merged else left_edge.rightHalf
+      node_out = right_edge.leftHalf.next if right_merged else right_edge.leftHalf
+      left_out = left_edge.leftHalf.next if left_merged else left_edge.leftHalf
+      right_in = right_edge.rightHalf.prev if right_merged else right_edge.rightHalf
+      node_in.setNext(node_out)
+      ancestor.edge.leftHalf.setNext(left_out)
+      right_in.setNext(ancestor.edge.rightHalf)
+
+    # cells held by a dropped half edge are given another one
+    if left_merged:
+      self.replaceHalfEdge(left_edge.leftHalf, ancestor.edge.leftHalf)
+      self.replaceHalfEdge(left_edge.rightHalf, node_in)
+    if right_merged:
+      self.replaceHalfEdge(right_edge.leftHalf, node_in)
+      self.replaceHalfEdge(right_edge.rightHalf, ancestor.edge.rightHalf)
+
+    # two edges ended at v and one started, less the ends of the dropped edges
+    if found and self.out is None:
+      self.vertices.degrees[v] += 3 - 2 * (left_merged + right_merged)
+      self.vertices.halfEdges[v] = ancestor.edge.rightHalf
 
     # eliminate middle arc (leaf node) from beach line tree
-    node.remove()
+    self.rebalance(node.remove())
 
     # May find new neighbors after deletion so must check
     # for circles as well...
@@ -19,8 +19,20 @@ class Arc:
 
   Discovered potential circle events are stored with the associated
   Arc node.
+
+  Leaf nodes are also threaded into a doubly linked list in beachline order.
+  Each leaf knows its neighbouring arcs (prev/next) and the interior nodes
+  holding the breakpoints on either side (leftBreak/rightBreak), so neighbours
+  can be found without walking the tree.
+
+  The tree is kept AVL-balanced through rotations. A rotation preserves the
+  in-order sequence of nodes, so every interior node keeps the same pair of
+  neighbouring leaves and therefore still owns the correct bisection edge.
   """
 
+  __slots__ = ('parent', 'left', 'right', 'edge', 'site', 'isLeaf', 'circleEvent', 'height',
+               'prev', 'next', 'leftBreak', 'rightBreak')
+
   def __init__(self, point=None, edge=None):
     self.parent = None
     self.left = None
@@ -31,6 +43,13 @@ class Arc:
     if point:
       self.isLeaf = True
     self.circleEvent = None
+    self.height = 1
+
+    # Beachline neighbours, only maintained for leaf nodes
+    self.prev = None
+    self.next = None
+    self.leftBreak = None
+    self.rightBreak = None
 
   def __str__(self):
     left_s = ''
@@ -68,6 +87,89 @@ class Arc:
     self.right = n
     n.parent = self
 
+  def setNext(self, n, breakpoint):
+    """Link leaf n as right neighbour of this leaf, separated by breakpoint."""
+    self.next = n
+    self.rightBreak = breakpoint
+    n.prev = self
+    n.leftBreak = breakpoint
+
+  def replaceInBeachline(self, first, last):
+    """Splice the run of leaves first..last into the place of this leaf."""
+    first.prev = self.prev
+    first.leftBreak = self.leftBreak
+    if self.prev:
+      self.prev.next = first
+
+    last.next = self.next
+    last.rightBreak = self.rightBreak
+    if self.next:
+      self.next.prev = last
+
+    # no longer a leaf, so drop links that would keep old arcs alive
+    self.prev = self.next = self.leftBreak = self.rightBreak = None
+    self.circleEvent = None
+
+  def replaceChild(self, old, new):
+    """Put new in place of the child old."""
+    if self.left == old:
+      self.setLeft(new)
+    else:
+      self.setRight(new)
+
+  def updateHeight(self):
+    self.height = 1 + max(self.left.height, self.right.height)
+
+  def balanceFactor(self):
+    return self.left.height - self.right.height
+
+  def rotateLeft(self):
+    """Rotate so that right child takes the place of self. Returns new subtree root."""
+    pivot = self.right
+    parent = self.parent
+    self.setRight(pivot.left)
+    pivot.setLeft(self)
+    if parent is None:
+      pivot.parent = None
+    else:
+      parent.replaceChild(self, pivot)
+
+    self.updateHeight()
+    pivot.updateHeight()
+    return pivot
+
+  def rotateRight(self):
+    """Rotate so that left child takes the place of self. Returns new subtree root."""
+    pivot = self.left
+    parent = self.parent
+    self.setLeft(pivot.right)
+    pivot.setRight(self)
+    if parent is None:
+      pivot.parent = None
+    else:
+      parent.replaceChild(self, pivot)
+
+    self.updateHeight()
+    pivot.updateHeight()
+    return pivot
+
+  def rebalance(self):
+    """
+    Restore AVL balance at this interior node, assuming both sub-trees are
+    balanced. Returns the root of the (possibly rotated) subtree.
+    """
+    self.updateHeight()
+    balance = self.balanceFactor()
+    if balance > 1:
+      if self.left.balanceFactor() < 0:
+        self.left.rotateLeft()
+      return self.rotateRight()
+    if balance < -1:
+      if self.right.balanceFactor() > 0:
+        self.right.rotateRight()
+      return self.rotateLeft()
+    return self
+
   def getLeftAncestor(self):
     """
     Find first ancestor with right link to a parent of self (if exists).
@@ -108,16 +210,26 @@ class Arc:
 
     return n
 
+  def survivingBreak(self):
+    """
+    Of the two breakpoints around this leaf, the one which is not its parent.
+    It is the one that remains once the leaf is removed.
+    """
+    if self.parent == self.leftBreak:
+      return self.rightBreak
+    return self.leftBreak
+
   def remove(self):
-    """Remove leaf node from tree. """
+    """
+    Remove leaf node from tree, along with its parent which is replaced by
+    the sibling. Returns the grandparent, from which balance must be restored.
+    """
+    self.prev.setNext(self.next, self.survivingBreak())
+
     grand_parent = self.parent.parent
     if self.parent.left == self:
-      if grand_parent.left == self.parent:
-        grand_parent.setLeft(self.parent.right)
-      else:
-        grand_parent.setRight(self.parent.right)
+      grand_parent.replaceChild(self.parent, self.parent.right)
     else:
-      if grand_parent.left == self.parent:
-        grand_parent.setLeft(self.parent.left)
-      else:
-        grand_parent.setRight(self.parent.left)
+      grand_parent.replaceChild(self.parent, self.parent.left)
+
+    return grand_parent
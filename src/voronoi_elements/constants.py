@@ -3,3 +3,7 @@ minValue = -2147483648
 
 X = 0
 Y = 1
+
+# Event queue is compacted once cancelled events make up more than half
+# of a heap holding at least this many entries.
+minCompactionSize = 64
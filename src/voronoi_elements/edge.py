@@ -1,5 +1,7 @@
 from src.voronoi_elements.point import Point
+from src.voronoi_elements.half_edge import HalfEdge
 from src.voronoi_elements.constants import maxValue
+from src.voronoi_elements.predicates import incircle
 
 
 class Edge:
@@ -9,14 +11,35 @@ class Edge:
   Edge has orientation based on the relative location of left and right points, which
   is used when detecting intersections. This is a subtle but critical part of the
   algorithm.
+
+  The edge is traced from start to end, with the cell of left on its left side as
+  seen along the sweep, so rightHalf runs from start to end and leftHalf from end
+  to start. An edge traced in the opposite direction from the same start is the
+  same Voronoi edge, so it shares the half edges of that opposite edge.
+
+  Start is the point the edge is traced from, which anchors its line during the sweep.
+  The vertices at either end of the Voronoi edge are kept as ids on the half edges.
+  Once the vertex at its start is found by a circle event, the edge keeps the three
+  sites on that circle.
   """
 
-  def __init__(self, p, left, right):
+  __slots__ = ('left', 'right', 'partner', 'rightYFirst', 'rightXFirst', 'm', 'b', 'x', 'start',
+               'leftHalf', 'rightHalf', 'circle')
+
+  def __init__(self, p, left, right, opposite=None):
 
     self.left = left
     self.right = right
     self.partner = None
-    self.end = None
+    self.circle = None
+
+    if opposite is None:
+      self.leftHalf = HalfEdge(left.polygon)
+      self.rightHalf = HalfEdge(right.polygon)
+      self.leftHalf.setTwin(self.rightHalf)
+    else:
+      self.leftHalf = opposite.rightHalf
+      self.rightHalf = opposite.leftHalf
 
     # record orientation from sweep point of view (first means seen first by sweep).
     self.rightYFirst = right.y > left.y
@@ -28,33 +51,45 @@ class Edge:
       self.m = maxValue
       self.b = None
       self.x = (right.x + left.x) / 2
-      self.start = Point((p.x, p.y))
     else:
       # Compute line characteristics.
       self.m = (right.x - left.x) / (left.y - right.y)
       self.b = p.y - self.m * p.x
       self.x = None
-      self.start = Point((p.x, p.y))
+    self.start = p
 
-  def finish(self, width, height):
+  def finish(self, width, height, vertices):
     """
-    Close half edge, if self.end does not exist, assuming bounding box.
-    Might extend point in both directions. Crop to bounding box as needed.
+    Close half edge, which has no end yet, assuming bounding box. The end is added
+    to vertices. Might extend point in both directions. Crop to bounding box as needed.
     """
-    if self.rightYFirst:
-      y = width * self.m + self.b
-      if y < 0:
+    if self.b is None and not self.rightYFirst:
+      # vertical line runs upwards only when its sites are seen right to left
+      p = (self.x, height if self.rightXFirst else 0)
+    else:
+      x = width if self.rightYFirst else 0
+      y = x * self.m + self.b
+      # a horizontal line never meets the top or bottom, so ends on the side
+      if y < 0 and self.m != 0:
         p = (-self.b / self.m, 0)
-      elif y > height:
+      elif y > height and self.m != 0:
         p = ((height - self.b) / self.m, height)
       else:
-        p = (width, y)
-    elif self.b is None:
-      p = (self.x, 0)
-    else:
-      p = (0, self.b)
+        p = (x, y)
+
+    self.setEnd(vertices.add(Point(p), self.leftHalf, 1))
+
+  def startsOnCircle(self, site):
+    """Return whether edge starts from a vertex found by a circle through site."""
+    return self.circle is not None and incircle(*self.circle, site) == 0
+
+  def setEnd(self, v):
+    """Terminate edge at vertex v, which becomes the origin of its left half edge."""
+    self.leftHalf.origin = v
 
-    self.end = Point(p)
+  def vertexIds(self):
+    """Return ids of the vertices at both ends of the Voronoi edge."""
+    return self.rightHalf.origin, self.leftHalf.origin
 
   def intersect(self, other):
     """Return point of intersection between two (half-)edges."""
@@ -94,5 +129,4 @@ class Edge:
     return p
 
   def __str__(self):
-    end_s = str(self.end) if self.end else ''
-    return '[' + str(self.start) + ',' + end_s + ']'
+    return '[' + str(self.rightHalf.origin) + ',' + str(self.leftHalf.origin) + ']'
@@ -1,6 +1,8 @@
 class Event:
   """Event in the queue. If an event is deleted, it still remains in the queue, but is not processed."""
 
+  __slots__ = ('p', 'site', 'y', 'deleted', 'node')
+
   def __init__(self, p, site=None):
     self.p = p
     self.site = site
@@ -0,0 +1,129 @@
+from heapq import heapify, heappop, heappush
+
+import numpy as np
+
+from src.voronoi_elements.constants import minCompactionSize
+from src.voronoi_elements.event import Event
+from src.voronoi_elements.site import Site
+
+
+class EventQueue:
+  """
+  Priority queue of events, in the order the sweep line meets them: higher Y values
+  first, ties broken on smaller x and then on insertion order so the order is
+  deterministic.
+
+  Entries are stored as tuples (-y, x, seq, event) so that heap comparisons work on
+  primitive keys instead of going through Event.__lt__. A cancelled event stays in
+  the heap as a tombstone until popped, but once tombstones make up more than half
+  the heap it is compacted. Counters record the traffic through the queue.
+
+  Sites may instead be given up front as an n x 2 array already in sweep order,
+  along with their ids. They are then consumed from a cursor and merged with the
+  heap, which only holds circle events. On equal keys the site comes first, as it
+  would have been pushed earlier. A site Event is only created when it is popped.
+
+  Instead of one array, chunks may be an iterator of such (sites, ids) pairs, the
+  sites of each following on from the last in sweep order. The next chunk is only
+  taken once the cursor is through the one before.
+  """
+
+  def __init__(self, sites=None, ids=None, chunks=None):
+    self.heap = []
+    self.seq = 0
+    self.tombstones = 0
+
+    if sites is None:
+      sites = np.empty((0, 2))
+      ids = ()
+    self.siteXs = sites[:, 0]
+    self.siteYs = sites[:, 1]
+    self.siteIds = ids
+    self.cursor = 0
+    self.chunks = chunks
+
+    self.pushes = 0
+    self.pops = 0
+    self.cancellations = 0
+    self.compactions = 0
+
+  def __len__(self):
+    """Number of live events, counting only the sites of the current chunk."""
+    if self.chunks is not None and self.cursor == len(self.siteIds):
+      self.nextChunk()
+    return len(self.heap) - self.tombstones + len(self.siteIds) - self.cursor
+
+  def push(self, event):
+    heappush(self.heap, (-event.y, event.p.x, self.seq, event))
+    self.seq += 1
+    self.pushes += 1
+
+  def pop(self):
+    """Remove and return next live event, or None if there is none."""
+    if self.chunks is not None and self.cursor == len(self.siteIds):
+      self.nextChunk()
+    if self.cursor < len(self.siteIds):
+      x = float(self.siteXs[self.cursor])
+      y = float(self.siteYs[self.cursor])
+      self.dropTombstones()
+      if not self.heap or (-y, x) <= self.heap[0][:2]:
+        pt = Site((x, y), int(self.siteIds[self.cursor]))
+        self.cursor += 1
+        self.pops += 1
+        return Event(pt, site=pt)
+
+    while self.heap:
+      event = heappop(self.heap)[3]
+      if event.deleted:
+        self.tombstones -= 1
+        continue
+
+      self.pops += 1
+      return event
+
+    return None
+
+  def nextChunk(self):
+    """Move the cursor on to the next chunk of sites that is not empty, if any."""
+    for sites, ids in self.chunks:
+      if len(ids):
+        self.siteXs = sites[:, 0]
+        self.siteYs = sites[:, 1]
+        self.siteIds = ids
+        self.cursor = 0
+        return
+    self.chunks = None
+
+  def dropTombstones(self):
+    """Pop cancelled events from the top of the heap."""
+    while self.heap and self.heap[0][3].deleted:
+      heappop(self.heap)
+      self.tombstones -= 1
+
+  def cancel(self, event):
+    """Cancel an event still in the queue, so that it is never returned by pop."""
+    if event.deleted:
+      return
+
+    event.deleted = True
+    self.tombstones += 1
+    self.cancellations += 1
+
+    if len(self.heap) >= minCompactionSize and 2 * self.tombstones > len(self.heap):
+      self.compact()
+
+  def compact(self):
+    """Drop all tombstones from the heap."""
+    self.heap = [entry for entry in self.heap if not entry[3].deleted]
+    heapify(self.heap)
+    self.tombstones = 0
+    self.compactions += 1
+
+  def stats(self):
+    return {
+      'pushes': self.pushes,
+      'pops': self.pops,
+      'cancellations': self.cancellations,
+      'compactions': self.compactions,
+      'size': len(self.heap),
+    }
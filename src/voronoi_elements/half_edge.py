@@ -0,0 +1,37 @@
+class HalfEdge:
+  """
+  One side of a Voronoi edge in the doubly connected edge list, bounding the cell
+  (face) of a single site. Half edges of a cell are linked counter clockwise through
+  next/prev, and twin is the half edge on the other side, bounding the neighbouring
+  cell. A half edge runs from its origin to the origin of its twin.
+
+  Origin is the id of a vertex in the VertexTable. It is only known once the sweep
+  finds the vertex the half edge starts from, and next/prev
+  once the vertex it ends at is found. Half edges of unbounded cells form a chain
+  rather than a cycle, until cells are closed against the bounding box.
+  """
+
+  __slots__ = ('origin', 'twin', 'next', 'prev', 'face')
+
+  def __init__(self, face):
+    self.origin = None
+    self.twin = None
+    self.next = None
+    self.prev = None
+    self.face = face
+    if face.halfEdge is None:
+      face.halfEdge = self
+
+  def setTwin(self, other):
+    self.twin = other
+    other.twin = self
+
+  def setNext(self, other):
+    self.next = other
+    other.prev = self
+
+  def destination(self):
+    return self.twin.origin
+
+  def __str__(self):
+    return '[' + str(self.origin) + ',' + str(self.destination()) + ']'
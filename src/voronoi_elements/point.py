@@ -1,21 +1,18 @@
 class Point:
   """
-  Every point defines center of a Voronoi Polygon. Maintains index for post-processing.
-  Voronoi Polygon is defined here rather than Arc because those objects come and
-  go as the BeachLine is processed.
+  Plain geometric point, used for breakpoints, Voronoi vertices and edge endpoints.
+  Input points are represented by the Site subclass, which also owns a cell.
 
-  To deal with floating point issues, all values are rounded to four digits of precision.
-  This allows test cases to be accurately defined and helps eliminate special cases.
+  Coordinates are kept at full precision. Decisions that are sensitive to floating
+  point errors go through the exact predicates in predicates.py instead.
   """
 
-  def __init__(self, p, idx=None):
-    """ p is a tuple (x,y)."""
-    self.x = round(p[0], 4)
-    self.y = round(p[1], 4)
+  __slots__ = ('x', 'y')
 
-    from src.voronoi_elements.polygon import Polygon
-    self.polygon = Polygon((self.x, self.y))
-    self.idx = idx
+  def __init__(self, p):
+    """ p is a tuple (x,y)."""
+    self.x = float(p[0])
+    self.y = float(p[1])
 
   def __eq__(self, other):
     if other is None:
@@ -1,42 +1,58 @@
-from collections import deque
-
-
 class Polygon:
   """
   Represents a polygon in the Voronoi Diagram around a point pt=(x,y).
-  Points are listed counter clockwise. When horizontal or vertical lines
-  in the Voronoi Diagram are computed, the polygons are often incomplete.
-  The computed Edges in the Diagram are accurate, however.
+
+  The polygon is the face of its cell in the doubly connected edge list,
+  holding one of its bounding half edges. Walking the half edges gives the
+  boundary, vertices and neighbours of the cell in counter clockwise order.
+  Vertices are given as ids into the VertexTable of the diagram.
   """
 
+  __slots__ = ('pt', 'halfEdge')
+
   def __init__(self, pt):
-    self.points = []
     self.pt = pt
-    self.first = None
-    self.last = None
+    self.halfEdge = None
 
   def isEmpty(self):
-    return self.first is None
-
-  def addToEnd(self, pt):
-    if len(self.points) == 0:
-      self.first = self.last = pt
-      self.points.append(pt)
-    else:
-      self.points.append(pt)
-      self.last = pt
-
-  def addToFront(self, pt):
-    if len(self.points) == 0:
-      self.first = self.last = pt
-      self.points.append(pt)
-    else:
-      self.points.insert(0, pt)
-      self.first = pt
+    return self.halfEdge is None
+
+  def halfEdges(self):
+    """
+    Yield the half edges bounding this cell, counter clockwise. For an unbounded
+    cell the chain is walked from its first half edge.
+    """
+    if self.halfEdge is None:
+      return
+
+    start = self.halfEdge
+    while start.prev is not None and start.prev is not self.halfEdge:
+      start = start.prev
+
+    h = start
+    while h is not None:
+      yield h
+      h = h.next
+      if h is start:
+        return
+
+  def vertices(self):
+    """Return ids of the vertices of the cell in counter clockwise order."""
+    vertices = []
+    for h in self.halfEdges():
+      if h.origin is not None:
+        vertices.append(h.origin)
+      if h.next is None and h.destination() is not None:
+        vertices.append(h.destination())
+    return vertices
+
+  def neighbours(self):
+    """Return faces of the neighbouring cells in counter clockwise order."""
+    return [h.twin.face for h in self.halfEdges()]
 
   def __str__(self):
     rep = '{'
-    for pt in self.points:
-      rep = rep + str(pt) + ', '
+    for v in self.vertices():
+      rep = rep + str(v) + ', '
     rep = rep + '}'
     return rep
@@ -0,0 +1,95 @@
+from fractions import Fraction
+
+# Error bounds of the floating point filters, following Shewchuk's
+# "Adaptive Precision Floating-Point Arithmetic and Fast Robust Geometric Predicates".
+epsilon = 2.0 ** -53
+ccwErrBound = (3.0 + 16.0 * epsilon) * epsilon
+iccErrBound = (10.0 + 96.0 * epsilon) * epsilon
+arcErrBound = (8.0 + 64.0 * epsilon) * epsilon
+
+
+def orient2d(a, b, c):
+  """
+  Positive if a, b, c are in counter clockwise order, negative if clockwise and zero
+  if collinear. Evaluated in floating point, falling back to exact arithmetic only
+  when the result is too close to zero for its sign to be trusted.
+  """
+  det_left = (a.x - c.x) * (b.y - c.y)
+  det_right = (a.y - c.y) * (b.x - c.x)
+  det = det_left - det_right
+  if abs(det) > ccwErrBound * (abs(det_left) + abs(det_right)):
+    return det
+
+  ax, ay, bx, by, cx, cy = map(Fraction, (a.x, a.y, b.x, b.y, c.x, c.y))
+  return float((ax - cx) * (by - cy) - (ay - cy) * (bx - cx))
+
+
+def incircle(a, b, c, d):
+  """
+  Positive if d lies inside the circle through a, b, c (given counter clockwise),
+  negative if outside and zero if on it. Filtered like orient2d.
+  """
+  adx, ady = a.x - d.x, a.y - d.y
+  bdx, bdy = b.x - d.x, b.y - d.y
+  cdx, cdy = c.x - d.x, c.y - d.y
+
+  alift = adx * adx + ady * ady
+  blift = bdx * bdx + bdy * bdy
+  clift = cdx * cdx + cdy * cdy
+
+  bc = bdx * cdy - cdx * bdy
+  ca = cdx * ady - adx * cdy
+  ab = adx * bdy - bdx * ady
+  det = alift * bc + blift * ca + clift * ab
+
+  permanent = (alift * (abs(bdx * cdy) + abs(cdx * bdy)) +
+               blift * (abs(cdx * ady) + abs(adx * cdy)) +
+               clift * (abs(adx * bdy) + abs(bdx * ady)))
+  if abs(det) > iccErrBound * permanent:
+    return det
+
+  ax, ay, bx, by, cx, cy, dx, dy = map(Fraction, (a.x, a.y, b.x, b.y, c.x, c.y, d.x, d.y))
+  adx, ady, bdx, bdy, cdx, cdy = ax - dx, ay - dy, bx - dx, by - dy, cx - dx, cy - dy
+  return float((adx * adx + ady * ady) * (bdx * cdy - cdx * bdy) +
+               (bdx * bdx + bdy * bdy) * (cdx * ady - adx * cdy) +
+               (cdx * cdx + cdy * cdy) * (adx * bdy - bdx * ady))
+
+
+def arcOrder(a, b, q):
+  """
+  Positive if, with the sweep line through q, the parabola of site a passes nearer
+  to q than that of site b straight above it, negative if further and zero where
+  they cross. Both sites must lie above q. Filtered like orient2d.
+  """
+  da, db = a.y - q.y, b.y - q.y
+  qa = (a.x - q.x) * (a.x - q.x) + da * da
+  qb = (b.x - q.x) * (b.x - q.x) + db * db
+  det_left = da * qb
+  det_right = db * qa
+  det = det_left - det_right
+  if abs(det) > arcErrBound * (abs(det_left) + abs(det_right)):
+    return det
+
+  ax, ay, bx, by, qx, qy = map(Fraction, (a.x, a.y, b.x, b.y, q.x, q.y))
+  da, db = ay - qy, by - qy
+  return float(da * ((bx - qx) ** 2 + db * db) - db * ((ax - qx) ** 2 + da * da))
+
+
+def circumcenter(a, b, c):
+  """
+  Return center (x, y) of circle through a, b, c, which must not be collinear.
+  Computed exactly when they turn by too little to trust the sign of the turn.
+  """
+  ax, ay = a.x, a.y
+  bx, by = b.x - ax, b.y - ay
+  cx, cy = c.x - ax, c.y - ay
+  det_left = bx * cy
+  det_right = by * cx
+  if abs(det_left - det_right) <= ccwErrBound * (abs(det_left) + abs(det_right)):
+    ax, ay = Fraction(ax), Fraction(ay)
+    bx, by, cx, cy = Fraction(b.x) - ax, Fraction(b.y) - ay, Fraction(c.x) - ax, Fraction(c.y) - ay
+
+  d = 2 * (bx * cy - by * cx)
+  b2 = bx * bx + by * by
+  c2 = cx * cx + cy * cy
+  return float(ax + (cy * b2 - by * c2) / d), float(ay + (bx * c2 - cx * b2) / d)
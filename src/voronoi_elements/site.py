@@ -0,0 +1,18 @@
+from src.voronoi_elements.point import Point
+from src.voronoi_elements.polygon import Polygon
+
+
+class Site(Point):
+  """
+  Every site defines center of a Voronoi Polygon. Maintains index for post-processing.
+  Voronoi Polygon is defined here rather than Arc because those objects come and
+  go as the BeachLine is processed.
+  """
+
+  __slots__ = ('polygon', 'idx')
+
+  def __init__(self, p, idx=None):
+    """ p is a tuple (x,y)."""
+    Point.__init__(self, p)
+    self.polygon = Polygon((self.x, self.y))
+    self.idx = idx
@@ -0,0 +1,110 @@
+from array import array
+
+import numpy as np
+
+from src.voronoi_elements.point import Point
+
+
+class VertexTable:
+  """
+  Stores every Voronoi vertex once. Half edges, edges and cells refer to vertices
+  by their integer id, which is their position in the table.
+
+  Coordinates are kept in flat arrays of doubles. Every vertex also records its
+  degree (the number of edges meeting there) and one half edge leaving it, from
+  which the others can be found by turning around the vertex.
+
+  Ids of removed vertices are reused by vertices added later.
+  """
+
+  __slots__ = ('xs', 'ys', 'degrees', 'halfEdges', 'free')
+
+  def __init__(self):
+    self.xs = array('d')
+    self.ys = array('d')
+    self.degrees = array('i')
+    self.halfEdges = []
+    self.free = []
+
+  def __len__(self):
+    return len(self.xs)
+
+  def add(self, p, half_edge, degree):
+    """Add vertex at p where degree edges meet, half_edge leaving it. Returns its id."""
+    if self.free:
+      v = self.free.pop()
+      self.xs[v] = p.x
+      self.ys[v] = p.y
+      self.degrees[v] = degree
+      self.halfEdges[v] = half_edge
+      return v
+
+    self.xs.append(p.x)
+    self.ys.append(p.y)
+    self.degrees.append(degree)
+    self.halfEdges.append(half_edge)
+    return len(self.xs) - 1
+
+  def remove(self, v):
+    self.degrees[v] = 0
+    self.halfEdges[v] = None
+    self.free.append(v)
+
+  def move(self, ids, coords):
+    """Move vertices ids to coords, a k x 2 array, at once."""
+    np.frombuffer(self.xs)[ids] = coords[:, 0]
+    np.frombuffer(self.ys)[ids] = coords[:, 1]
+
+  def point(self, v):
+    return Point((self.xs[v], self.ys[v]))
+
+  def degree(self, v):
+    return self.degrees[v]
+
+  def outgoing(self, v):
+    """Yield half edges leaving vertex v."""
+    start = self.halfEdges[v]
+    h = start
+    while True:
+      yield h
+      if h.prev is None:
+        break
+      h = h.prev.twin
+      if h is start:
+        return
+
+    # vertex on the boundary of an unbounded cell, so turn the other way as well
+    h = start.twin.next
+    while h is not None:
+      yield h
+      h = h.twin.next
+
+  def neighbours(self, v):
+    """Return ids of the vertices joined to v by an edge."""
+    return [h.destination() for h in self.outgoing(v)]
+
+  def asArray(self):
+    """Return V x 2 array of vertex coordinates."""
+    return np.column_stack([np.array(self.xs, dtype=float), np.array(self.ys, dtype=float)]).reshape(-1, 2)
+
+
+class VertexStream:
+  """
+  Stands in for VertexTable while streaming, handing every vertex on to out as a
+  record ('vertex', id, x, y) instead of storing it.
+  """
+
+  __slots__ = ('out', 'count')
+
+  def __init__(self, out):
+    self.out = out
+    self.count = 0
+
+  def __len__(self):
+    return self.count
+
+  def add(self, p, half_edge, degree):
+    v = self.count
+    self.count += 1
+    self.out.append(('vertex', v, p.x, p.y))
+    return v
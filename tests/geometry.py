@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def edgeMap(diagram, box=None):
+  """Return the clipped edges of diagram longer than rounding, by their pair of sites."""
+  clipped = diagram.clip(box)
+  edges = {}
+  for pair, (a, b) in zip(np.sort(clipped.edgeSites, axis=1).tolist(), clipped.edges):
+    if np.hypot(*(a - b)) > 1e-9:
+      assert tuple(pair) not in edges
+      edges[tuple(pair)] = np.array(sorted([tuple(a), tuple(b)]))
+  return edges
+
+
+def assertSameEdges(first, second):
+  """Assert two edge maps hold the same edges, up to rounding."""
+  assert first.keys() == second.keys()
+  for pair, ends in first.items():
+    assert np.allclose(ends, second[pair], atol=1e-9), pair
+
+
+def area(polygon):
+  if len(polygon) < 3:
+    return 0.0
+  x, y = polygon[:, 0], polygon[:, 1]
+  return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def cellAreas(clipped):
+  return np.array([area(clipped.cell(i)) for i in range(len(clipped.sites))])
+
+
+def nearest(points, sites):
+  """Return the id of the site nearest each of points, by brute force."""
+  return np.argmin(((points[:, None, :] - sites[None, :, :]) ** 2).sum(axis=2), axis=1)
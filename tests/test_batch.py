@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.batch import solveBatch
+from src.voronoi import Voronoi
+from tests.geometry import area, edgeMap
+
+width, height = 10, 10
+
+
+def batchEdges(batch, b):
+  edges, edge_sites = batch.diagramEdges(b)
+  return {tuple(sorted(pair)) for pair, (p, q) in zip(edge_sites.tolist(), edges)
+          if np.hypot(*(p - q)) > 1e-9}
+
+
+def testBatchMatchesEngine():
+  points = np.random.default_rng(6).random((100, 7, 2)) * (width, height)
+  points[50:, 3] = points[50:, 1]
+  batch = solveBatch(points, width, height)
+  for b in range(len(points)):
+    voronoi = Voronoi(width, height, engine='delaunay')
+    voronoi.process(points[b])
+    assert batchEdges(batch, b) == set(edgeMap(voronoi.diagram()))
+
+
+def testDuplicatesHaveOneCell():
+  batch = solveBatch(np.array([[(1, 1), (1, 1), (5, 5)]], dtype=float), width, height)
+  assert batch.diagramEdges(0)[1].tolist() == [[0, 2]]
+  assert len(batch.cell(0, 1)) == 0 and len(batch.cell(0, 0)) > 2
+
+
+def testCellsCoverBox():
+  points = np.round(np.random.default_rng(5).random((50, 8, 2)) * width)
+  points[::7, 5] = np.nan
+  batch = solveBatch(points, width, height)
+  for b in range(len(points)):
+    areas = np.array([area(batch.cell(b, i)) for i in range(8)])
+    assert abs(areas.sum() - width * height) < 1e-9
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from src.voronoi import Voronoi, engines
+from tests.geometry import assertSameEdges, cellAreas, edgeMap, nearest
+
+width, height = 100, 100
+
+
+def randomSites(seed, n=300):
+  return np.random.default_rng(seed).random((n, 2)) * (width, height)
+
+
+def gridSites(seed):
+  rng = np.random.default_rng(seed)
+  nx, ny = rng.integers(2, 9, 2)
+  step = rng.integers(3, 12)
+  xs, ys = np.meshgrid(np.arange(nx) * step + 5, np.arange(ny) * step + 5)
+  sites = np.column_stack([xs.ravel(), ys.ravel()]).astype(float)
+  rng.shuffle(sites)
+  return sites
+
+
+def duplicateSites(seed):
+  rng = np.random.default_rng(seed)
+  sites = rng.random((30, 2)) * (width, height)
+  sites = np.vstack([sites, sites[rng.permutation(30)[:15]]])
+  rng.shuffle(sites)
+  return sites
+
+
+def roundedSites(seed):
+  rng = np.random.default_rng(seed)
+  return np.round(rng.random((rng.integers(3, 60), 2)) * 10) * 10
+
+
+def collinearSites(seed):
+  rng = np.random.default_rng(seed)
+  t = np.sort(rng.random(20)) * 80 + 10
+  direction = [(1, 0), (0, 1), (1, 1), (1, -1)][seed % 4]
+  sites = np.array([(50, 50)]) + np.outer(t - 50, direction) * 0.5
+  rng.shuffle(sites)
+  return sites
+
+
+def outsideSites(seed):
+  rng = np.random.default_rng(seed)
+  sites = rng.random((int(rng.integers(3, 30)), 2)) * (2 * width, 2 * height) - (width / 2, height / 2)
+  # sites sharing an x have a horizontal bisector, maybe above or below the box
+  sites[:len(sites) // 2, 0] = np.round(sites[:len(sites) // 2, 0] / 20) * 20
+  return np.unique(sites, axis=0)
+
+
+def polygonSites(k, center=False):
+  t = np.arange(k) * 2 * np.pi / k
+  sites = np.column_stack([50 + 20 * np.cos(t), 50 + 20 * np.sin(t)])
+  return np.vstack([sites, [(50, 50)]]) if center else sites
+
+
+cases = ([('random', randomSites, seed) for seed in range(5)] +
+         [('grid', gridSites, seed) for seed in range(10)] +
+         [('duplicate', duplicateSites, seed) for seed in range(5)] +
+         [('rounded', roundedSites, seed) for seed in range(10)] +
+         [('collinear', collinearSites, seed) for seed in range(8)] +
+         [('outside', outsideSites, seed) for seed in range(10)])
+polygons = [('square', np.array([(20, 20), (30, 20), (20, 30), (30, 30)], dtype=float)),
+            ('hexagon', polygonSites(6)), ('centered hexagon', polygonSites(6, True))]
+
+
+def compute(sites, engine):
+  voronoi = Voronoi(width, height, engine=engine)
+  voronoi.process(sites)
+  return voronoi.diagram()
+
+
+@pytest.mark.parametrize('name, make, seed', cases)
+def testEnginesAgree(name, make, seed):
+  sites = make(seed)
+  assertSameEdges(edgeMap(compute(sites, 'fortune')), edgeMap(compute(sites, 'delaunay')))
+
+
+@pytest.mark.parametrize('name, sites', polygons)
+def testEnginesAgreeOnCocircularSites(name, sites):
+  fortune, delaunay = edgeMap(compute(sites, 'fortune')), edgeMap(compute(sites, 'delaunay'))
+  assert fortune.keys() == delaunay.keys()
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('name, make, seed', cases)
+def testCellsHoldNearestPoints(engine, name, make, seed):
+  sites = make(seed)
+  clipped = compute(sites, engine).clip()
+  assert abs(cellAreas(clipped).sum() - width * height) < 1e-6 * width * height
+
+  # the lowest id of duplicate sites owns the cell
+  _, first = np.unique(sites, axis=0, return_index=True)
+  later = np.setdiff1d(np.arange(len(sites)), first)
+  assert all(len(clipped.cell(i)) == 0 for i in later)
+
+  # every probe is in the cell of its nearest site, found by brute force
+  probes = np.random.default_rng(seed).random((500, 2)) * (width, height)
+  for p, i in zip(probes, nearest(probes, sites)):
+    cell = clipped.cell(i)
+    edge = np.roll(cell, -1, axis=0) - cell
+    offset = p - cell
+    assert (edge[:, 0] * offset[:, 1] - edge[:, 1] * offset[:, 0] >= -1e-7).all(), (p, i)
+
+
+@pytest.mark.parametrize('engine', engines)
+def testHorizontalBisectorOutsideBox(engine):
+  for sites in ([(5, -10), (5, -20), (50, 50)], [(5, 150), (5, 120), (60, 40)]):
+    assert len(compute(np.array(sites, dtype=float), engine).clip().edges) == 1
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from src.locate import SiteIndex
+from src.voronoi import Voronoi
+from tests.geometry import nearest
+
+width, height = 100, 100
+sites = np.random.default_rng(1).random((2000, 2)) * (width, height)
+queries = np.random.default_rng(2).random((20000, 2)) * (2 * width, 2 * height) - (width / 2, height / 2)
+
+
+def diagramOf(how):
+  voronoi = Voronoi(width, height)
+  if how == 'slabs':
+    return voronoi.processParallel(sites, workers=2, slabs=4)
+  if how == 'tiles':
+    return voronoi.processTiled(sites, workers=2, tiles=9)
+  voronoi.process(sites)
+  return voronoi.diagram()
+
+
+@pytest.mark.parametrize('how', ['serial', 'slabs', 'tiles'])
+def testLocateFindsNearestSite(how):
+  found = SiteIndex(diagramOf(how)).locate(queries)
+  best = nearest(queries, sites)
+  distance = ((queries - sites[found]) ** 2).sum(axis=1)
+  assert (distance <= ((queries - sites[best]) ** 2).sum(axis=1)).all()
+
+
+def testDuplicatesGoToLowestId():
+  voronoi = Voronoi(width, height)
+  voronoi.process(np.vstack([sites[:50], sites[:10]]))
+  found = SiteIndex(voronoi.diagram()).locate(sites[:10])
+  assert np.array_equal(found, np.arange(10))
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from src.voronoi import Voronoi
+from tests.geometry import assertSameEdges, cellAreas, edgeMap
+
+width, height = 100, 100
+
+
+def split(how, sites, engine='fortune'):
+  voronoi = Voronoi(width, height, engine=engine)
+  if how == 'slabs':
+    return voronoi.processParallel(sites, workers=2, slabs=4)
+  return voronoi.processTiled(sites, workers=2, tiles=9)
+
+
+def serial(sites, engine='fortune'):
+  voronoi = Voronoi(width, height, engine=engine)
+  voronoi.process(sites)
+  return voronoi.diagram()
+
+
+rng = np.random.default_rng(0)
+inputs = {
+  'uniform': np.random.default_rng(2).random((3000, 2)) * (width, height),
+  'outside': rng.random((2000, 2)) * (2 * width, 2 * height) - (width / 2, height / 2),
+  'row': np.column_stack([rng.random(400) * width, np.full(400, 50.0)]),
+  'column': np.column_stack([np.full(400, 30.0), rng.random(400) * height]),
+}
+
+
+@pytest.mark.parametrize('how', ['slabs', 'tiles'])
+@pytest.mark.parametrize('name', sorted(inputs))
+def testSameAsSerialThroughClip(how, name):
+  sites = inputs[name]
+  merged, whole = split(how, sites), serial(sites)
+  assertSameEdges(edgeMap(merged), edgeMap(whole))
+
+  areas = cellAreas(merged.clip())
+  assert abs(areas.sum() - width * height) < 1e-6 * width * height
+  assert np.allclose(areas, cellAreas(whole.clip()), atol=1e-6)
+
+
+@pytest.mark.parametrize('how', ['slabs', 'tiles'])
+def testNoDanglingVerticesInBox(how):
+  merged = split(how, inputs['uniform'], engine='delaunay')
+  degree = np.bincount(merged.edges.ravel(), minlength=len(merged.vertices))
+  inside = ((merged.vertices > 0) & (merged.vertices < (width, height))).all(axis=1)
+  assert not (inside & (degree < 3)).any()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src.voronoi import Voronoi, engines
+from tests.geometry import assertSameEdges, edgeMap
+
+width, height = 100, 100
+
+
+def recomputed(voronoi):
+  """Return edges of the diagram of the sites voronoi still holds, computed afresh."""
+  live = np.setdiff1d(np.arange(len(voronoi.sites)), sorted(voronoi.removedSites))
+  fresh = Voronoi(width, height)
+  fresh.process(voronoi.sites[live])
+  return {tuple(sorted(live[list(pair)])): ends for pair, ends in edgeMap(fresh.diagram()).items()}
+
+
+@pytest.mark.parametrize('engine', engines)
+def testUpdatesMatchRecompute(engine):
+  rng = np.random.default_rng(3)
+  voronoi = Voronoi(width, height, engine=engine)
+  voronoi.process(rng.random((300, 2)) * (width, height))
+  for _ in range(20):
+    voronoi.insert(rng.random(2) * (width, height))
+  for site_id in range(1, 40, 2):
+    voronoi.remove(site_id)
+  for site_id in range(100, 120):
+    voronoi.move(site_id, rng.random(2) * (width, height))
+  assertSameEdges(edgeMap(voronoi.diagram()), recomputed(voronoi))
+
+  # updates work on a triangulation of their own, and leave the engine as chosen
+  assert voronoi.engine == engine
+
+
+def testFrameMatchesRecompute():
+  rng = np.random.default_rng(4)
+  sites = rng.random((500, 2)) * (width, height)
+  voronoi = Voronoi(width, height)
+  voronoi.process(sites)
+  for _ in range(3):
+    sites = np.clip(sites + rng.normal(0, 0.5, sites.shape), 0, width)
+    voronoi.processFrame(sites)
+    assertSameEdges(edgeMap(voronoi.diagram()), recomputed(voronoi))